@@ -0,0 +1,93 @@
+"""Compare the CPU time of the figure callbacks: plotly.graph_objs vs dicts.
+
+Each figure callback of the app runs against the openFDA stub, first with
+plotly.graph_objs and PlotlyJSONEncoder (the former path), then with the
+dash_fda.figures builders and FastJSONEncoder. Both must produce the same
+JSON figure.
+
+    python -m benchmarks.figures [--years 10] [--repeat 20]
+"""
+import argparse
+import datetime
+import json
+import time
+from types import SimpleNamespace
+import plotly.graph_objs as go
+from _plotly_utils.utils import PlotlyJSONEncoder
+from benchmarks import openfda
+
+
+GRAPH_OBJS = SimpleNamespace(
+    scatter=go.Scatter,
+    pie=go.Pie,
+    box=go.Box,
+    layout=go.Layout,
+    figure=go.Figure,
+)
+
+SLIDER_CALLBACKS = ["update_pie_event", "update_pie_device"]
+STORE_CALLBACKS = [
+    "update_line_chart_by_year",
+    "update_line_chart_by_month",
+    "update_line_chart_by_day",
+    "update_box_plot_by_month",
+    "update_line_chart_daily",
+]
+
+
+def run(callback, args, builders, encoder, repeat):
+    """CPU seconds per call of callback + JSON encoding, and the last JSON."""
+    import dash_fda.app
+
+    dash_fda.app.dff = builders
+    start = time.process_time()
+    for _ in range(repeat):
+        figure = callback(*args)
+        encoded = json.dumps({"response": {"figure": figure}}, cls=encoder)
+    return (time.process_time() - start) / repeat, encoded
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.figures")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with openfda.patch():
+        import dash_fda.app
+        import dash_fda.figures
+
+        dash_fda.app.cache.clear()
+        year_end = datetime.date.today().year
+        year_range = [year_end - args.years + 1, year_end]
+        state = dash_fda.app.fetch_store_data(*year_range)
+
+        print(f"{'callback':<28} {'graph_objs':>12} {'dicts':>12} {'speedup':>8}")
+        for name in SLIDER_CALLBACKS + STORE_CALLBACKS:
+            # skip the Dash wrapper, which expects a request context
+            callback = getattr(dash_fda.app, name).__wrapped__
+            callback_args = [year_range] if name in SLIDER_CALLBACKS else [state]
+            # warm up the cache, so that both paths do the same work
+            run(callback, callback_args, dash_fda.figures, PlotlyJSONEncoder, 1)
+
+            slow, expected = run(
+                callback, callback_args, GRAPH_OBJS, PlotlyJSONEncoder, args.repeat
+            )
+            fast, actual = run(
+                callback,
+                callback_args,
+                dash_fda.figures,
+                dash_fda.figures.FastJSONEncoder,
+                args.repeat,
+            )
+            if json.loads(actual) != json.loads(expected):
+                raise AssertionError(f"{name}: the two paths build different figures")
+            print(
+                f"{name:<28} {slow * 1000:>10.2f}ms {fast * 1000:>10.2f}ms "
+                f"{slow / fast:>7.1f}x"
+            )
+        dash_fda.app.dff = dash_fda.figures
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Measure the memory allocated by each server callback of the app.
+
+Each callback runs against the openFDA stub, with a cold cache, for year ranges
+of several sizes. tracemalloc records the peak of the memory allocated while
+the callback runs and its response is encoded to JSON, and the memory still
+allocated afterwards (retained, e.g. by the last good results kept in case
+openFDA goes down). With --check, the command fails if a callback exceeds its
+budget in the budgets file (MEMORY_BUDGETS, or benchmarks/memory_budgets.json).
+With --update, it writes the measures to the budgets file instead, with some
+headroom: review the new budgets like code.
+
+    python -m benchmarks.memory [--check | --update] [--budgets PATH]
+
+The stub responses are rendered before the measurements, so the peaks do not
+include the buffers of the HTTP client.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from functools import lru_cache
+from benchmarks import openfda
+
+
+BUDGETS = os.environ.get(
+    "MEMORY_BUDGETS", os.path.join(os.path.dirname(__file__), "memory_budgets.json")
+)
+
+YEAR_END = 2020
+RANGE_SIZES = [1, 5, 10]
+MIB = 2 ** 20
+# budgets written by --update: measure * HEADROOM, at least MIN_BUDGET MiB
+HEADROOM = 1.5
+MIN_BUDGET = 0.5
+
+CALLBACKS = [
+    "update_table",
+    "set_data_in_store",
+    "update_selection",
+    "update_pie_event",
+    "update_pie_device",
+    "update_line_chart_by_year",
+    "update_line_chart_by_month",
+    "update_box_plot_by_month",
+    "update_line_chart_by_day",
+    "update_line_chart_daily",
+    "update_timeline",
+]
+STORE_CALLBACKS = CALLBACKS[5:10]
+
+
+def stub_get(url, timeout=None):
+    # the timeout depends on what is left of the deadline: not part of the key
+    return _rendered(url)
+
+
+@lru_cache(maxsize=None)
+def _rendered(url):
+    return openfda.get(url)
+
+
+def year_range(years):
+    return [YEAR_END - years + 1, YEAR_END]
+
+
+def callback_call(name, years):
+    """The arguments and the triggered inputs of a callback, as Dash sends them."""
+    from dash_fda.app import STORE_ID, fetch_store_data
+
+    selected = year_range(years)
+    if name == "update_table":
+        return [1, None, selected, "COVIDIEN", "ligasure"], "submit-button.n_clicks"
+    if name == "set_data_in_store":
+        return [selected, "COVIDIEN", "ligasure"], "year-slider.value"
+    if name == "update_selection":
+        click = {"points": [{"label": "Malfunction"}]}
+        return [click, None, None, None, selected, None], "pie-event.clickData"
+    if name in STORE_CALLBACKS:
+        # the store comes back from the browser as JSON
+        state = json.loads(json.dumps(fetch_store_data(*selected), cls=_encoder()))
+        return [state, None], f"{STORE_ID}.data"
+    if name == "update_timeline":
+        return [1000, None], "timeline-width.data"
+    return [selected, None], "year-slider.value"
+
+
+def _encoder():
+    # dash_fda.app may have replaced it with FastJSONEncoder
+    import plotly
+
+    return plotly.utils.PlotlyJSONEncoder
+
+
+def _run(callback, args, triggered):
+    """Call a Dash callback like Dash does, and encode its response."""
+    import flask
+    from dash_fda.app import app
+
+    with app.server.test_request_context():
+        flask.g.triggered_inputs = [{"prop_id": triggered, "value": None}]
+        # skip the Dash wrapper, which parses the request
+        output = callback.__wrapped__(*args)
+        return json.dumps({"response": output}, cls=_encoder())
+
+
+def _cold():
+    """Forget every result cached by the app (on disk and in memory)."""
+    from dash_fda.app import cache
+    from dash_fda.resilience import last_good
+
+    cache.clear()
+    last_good.clear()
+    gc.collect()
+
+
+class Harness:
+    """Run the callbacks of the app in isolation, against the openFDA stub.
+
+    The prefetcher and the response cache are disabled: the measures must not
+    depend on what they did before.
+    """
+
+    def __enter__(self):
+        from dash_fda.app import prefetcher, response_cache
+
+        self._patch = openfda.patch()
+        self._patch.start().side_effect = stub_get
+        self._settings = prefetcher.enabled, response_cache.enabled
+        prefetcher.enabled = response_cache.enabled = False
+        self._tracing = not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        from dash_fda.app import prefetcher, response_cache
+
+        if self._tracing:
+            tracemalloc.stop()
+        prefetcher.enabled, response_cache.enabled = self._settings
+        _cold()
+        self._patch.stop()
+
+    def measure(self, name, years):
+        """Peak and retained memory (bytes) of a callback, for a range of years."""
+        from dash_fda.profiling import reset_peak
+        import dash_fda.app
+
+        callback = getattr(dash_fda.app, name)
+        args, triggered = callback_call(name, years)
+        # a first run imports modules and fills the caches of the libraries
+        _run(callback, args, triggered)
+        _cold()
+
+        baseline = reset_peak()
+        encoded = _run(callback, args, triggered)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        del encoded
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        return peak, retained
+
+
+def load_budgets(path=BUDGETS):
+    """Budgets in MiB, by callback and by range size: {name: {years: {...}}}."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def over_budget(budgets, name, years, peak, retained):
+    """Describe the budgets a measure exceeds (empty if it has no budget)."""
+    budget = budgets.get(name, {}).get(str(years), {})
+    errors = []
+    for key, value in (("peak", peak), ("retained", retained)):
+        if key in budget and value > budget[key] * MIB:
+            errors.append(
+                f"{name} ({years} years): {key} {value / MIB:.2f} MiB "
+                f"> {budget[key]:.2f} MiB"
+            )
+    return errors
+
+
+def budget(value):
+    return max(MIN_BUDGET, round(value * HEADROOM / MIB, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory")
+    parser.add_argument("--years", type=int, nargs="+", default=RANGE_SIZES)
+    parser.add_argument("--budgets", default=BUDGETS)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true", help="fail over budget")
+    group.add_argument("--update", action="store_true", help="write the budgets")
+    args = parser.parse_args()
+    budgets = load_budgets(args.budgets) if os.path.exists(args.budgets) else {}
+
+    errors = []
+    print(f"{'callback':<28} {'years':>5} {'peak':>10} {'retained':>10}")
+    with Harness() as harness:
+        for name in CALLBACKS:
+            for years in args.years:
+                peak, retained = harness.measure(name, years)
+                print(
+                    f"{name:<28} {years:>5} {peak / MIB:>6.2f}MiB "
+                    f"{retained / MIB:>7.2f}MiB"
+                )
+                errors += over_budget(budgets, name, years, peak, retained)
+                if args.update:
+                    budgets.setdefault(name, {})[str(years)] = {
+                        "peak": budget(peak),
+                        "retained": budget(retained),
+                    }
+    if args.update:
+        with open(args.budgets, "w") as f:
+            json.dump(budgets, f, indent=2)
+            f.write("\n")
+    elif args.check and errors:
+        sys.exit("Over budget:\n" + "\n".join(errors))
+
+
+if __name__ == "__main__":
+    main()
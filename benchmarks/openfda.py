@@ -0,0 +1,68 @@
+"""A stub of the openFDA API, to run the callbacks without network access."""
+import datetime
+import json
+import random
+import re
+from unittest import mock
+
+
+DATE_RANGE = re.compile(r"\[(\d{4})-01-01\+TO\+(\d{4})-12-31\]")
+
+TERMS = {
+    "event_type": ["Malfunction", "Injury", "Death", "Other", "No answer provided"],
+    "device.openfda.device_class": ["1", "2", "3", "U", "N", "F"],
+}
+
+
+META = {
+    "disclaimer": "Stub data.",
+    "terms": "https://open.fda.gov/terms/",
+    "license": "https://open.fda.gov/license/",
+    "last_updated": "2020-09-18",
+}
+
+
+class StubResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        # like openFDA, every response has the metadata of the dataset
+        self.text = json.dumps(dict(payload, meta=META))
+
+
+def _daily_counts(rng, year_begin, year_end):
+    day = datetime.date(year_begin, 1, 1)
+    last = datetime.date(year_end, 12, 31)
+    results = []
+    while day <= last:
+        results.append({"time": day.strftime("%Y%m%d"), "count": rng.randint(0, 800)})
+        day += datetime.timedelta(days=1)
+    return results
+
+
+def get(url, timeout=None):
+    """Answer an openFDA URL with deterministic, plausible results."""
+    url = url.strip()
+    rng = random.Random(url)
+    match = DATE_RANGE.search(url)
+    year_begin, year_end = (int(y) for y in match.groups()) if match else (1991, 2020)
+
+    if "count=date_" in url:
+        return StubResponse(200, {"results": _daily_counts(rng, year_begin, year_end)})
+    for field, terms in TERMS.items():
+        if url.endswith(f"count={field}"):
+            results = [{"term": t, "count": rng.randint(1, 100000)} for t in terms]
+            return StubResponse(200, {"results": results})
+    if "&limit=" in url:
+        record = {
+            "event_type": "Malfunction",
+            "event_location": "HOSPITAL",
+            "reporter_occupation_code": "OTHER",
+        }
+        return StubResponse(200, {"results": [record] * 100})
+    return StubResponse(200, {"results": []})
+
+
+def patch():
+    """Patch the HTTP client used for openFDA requests with the stub."""
+    return mock.patch("dash_fda.resilience.resilience.requests.get", side_effect=get)
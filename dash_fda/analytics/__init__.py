@@ -0,0 +1,9 @@
+from .analytics import (
+    anomalies,
+    ewma,
+    lttb,
+    rolling_mean,
+    rolling_statistics,
+    rolling_std,
+    rolling_zscore,
+)
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import as_strided
+
+
+def _as_float_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def _window_sums(values, window):
+    """Sum of values over each trailing window, computed with a cumulative sum.
+
+    The i-th element is the sum of values[i - window + 1 : i + 1]. Incomplete
+    windows (the first window - 1 elements) are NaN.
+    """
+    out = np.full(values.shape, np.nan)
+    if window > values.size:
+        return out
+    csum = np.cumsum(np.concatenate(([0.0], values)))
+    out[window - 1 :] = csum[window:] - csum[:-window]
+    return out
+
+
+def rolling_mean(values, window):
+    """Trailing moving average (NaN until the first window is complete)."""
+    x = _as_float_array(values)
+    return _window_sums(x, window) / window
+
+
+def _windows(values, window):
+    """Read-only (n - window + 1, window) view of the trailing windows.
+
+    No data is copied: consecutive rows share memory, thanks to the strides.
+    """
+    n = values.size - window + 1
+    stride = values.strides[0]
+    return as_strided(
+        values, shape=(n, window), strides=(stride, stride), writeable=False
+    )
+
+
+def rolling_std(values, window):
+    """Trailing moving standard deviation (ddof=1, like pandas).
+
+    The sum-of-squares formula on cumulative sums loses too much precision on
+    flat windows (where the deviation must be exactly 0), so the deviations
+    are computed on a strided view of the windows instead.
+    """
+    x = _as_float_array(values)
+    out = np.full(x.shape, np.nan)
+    if window < 2 or window > x.size:
+        return out
+    out[window - 1 :] = _windows(x, window).std(axis=1, ddof=1)
+    return out
+
+
+def ewma(values, span):
+    """Exponentially weighted moving average (like pandas ewm(adjust=False)).
+
+    y[0] = x[0] and y[t] = (1 - alpha) * y[t - 1] + alpha * x[t], with
+    alpha = 2 / (span + 1). The recursion is unrolled with a cumulative sum of
+    x[i] * (1 - alpha) ** -i. Those weights grow exponentially, so the series
+    is processed in blocks short enough to keep them below 1e8, carrying the
+    last average of each block into the next one.
+    """
+    x = _as_float_array(values)
+    out = np.empty(x.shape)
+    if x.size == 0:
+        return out
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    if decay <= 0:
+        # span=1: every average is just the last value
+        out[:] = x
+        return out
+    block = max(1, int(np.log(1e8) / -np.log(decay)))
+    powers = decay ** np.arange(block + 1)
+
+    carry = x[0]
+    for start in range(0, x.size, block):
+        chunk = x[start : start + block]
+        n = chunk.size
+        # decay ** -i for i in [0, n), computed as a ratio to stay in range
+        scaled = np.cumsum(chunk / powers[:n])
+        decayed_carry = powers[1 : n + 1] * carry
+        out[start : start + n] = decayed_carry + alpha * powers[:n] * scaled
+        carry = out[start + n - 1]
+    return out
+
+
+def rolling_zscore(values, window):
+    """How many standard deviations each value is above its trailing baseline.
+
+    The baseline of the value at i is the window *before* i, so that a spike
+    does not inflate the statistics it is compared with. Values without a
+    complete baseline, or with a flat one, have a z-score of NaN.
+    """
+    x = _as_float_array(values)
+    return _zscore(x, rolling_mean(x, window), rolling_std(x, window))
+
+
+def _zscore(x, mean, std):
+    # the baseline of x[i] is the window ending at i - 1
+    baseline_mean = np.full(x.shape, np.nan)
+    baseline_std = np.full(x.shape, np.nan)
+    baseline_mean[1:] = mean[:-1]
+    baseline_std[1:] = std[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (x - baseline_mean) / baseline_std
+    z[~np.isfinite(z)] = np.nan
+    return z
+
+
+def anomalies(values, window, threshold):
+    """Boolean mask of the values whose rolling z-score exceeds threshold."""
+    return _above(rolling_zscore(values, window), threshold)
+
+
+def _above(zscore, threshold):
+    with np.errstate(invalid="ignore"):
+        return zscore > threshold
+
+
+def rolling_statistics(series, window, span, threshold):
+    """Compute moving statistics and anomaly bands for a date-indexed series.
+
+    Return a DataFrame with the same index as series and these columns:
+    count, mean, std, lower, upper (the mean ± threshold standard deviations
+    band), ewma, zscore and anomaly.
+    """
+    x = _as_float_array(series.values)
+    mean = rolling_mean(x, window)
+    std = rolling_std(x, window)
+    zscore = _zscore(x, mean, std)
+    return pd.DataFrame(
+        {
+            "count": x,
+            "mean": mean,
+            "std": std,
+            "lower": np.clip(mean - threshold * std, 0.0, None),
+            "upper": mean + threshold * std,
+            "ewma": ewma(x, span),
+            "zscore": zscore,
+            "anomaly": _above(zscore, threshold),
+        },
+        index=series.index,
+    )
+
+
+def lttb(x, y, threshold):
+    """Indices of the points kept by the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and last points are always kept. The points in between are split
+    in threshold - 2 buckets, and in each bucket the point kept is the one that
+    forms the largest triangle with the point kept in the previous bucket and
+    the average point of the next bucket. Peaks and dips survive downsampling,
+    unlike with a plain decimation or a bucket average.
+    """
+    x = _as_float_array(x)
+    y = _as_float_array(y)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # bucket i spans [edges[i], edges[i + 1]): every bucket has >= 1 point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x[:-1], edges[:-1]) / sizes
+    avg_y = np.add.reduceat(y[:-1], edges[:-1]) / sizes
+    # the "next bucket" of the last bucket is the last point
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # twice the area of the triangles (a, candidate, next average)
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
@@ -1,3 +1,4 @@
+import datetime
 import os
 import dash
 import dash_table
@@ -6,75 +7,197 @@ import chart_studio
 import pandas as pd
 import dash_core_components as dcc
 import dash_fda.components as dfc
+import dash_fda.figures as dff
 import dash_html_components as html
-import plotly.graph_objs as go
 from functools import partial
-from flask import Flask
+from flask import Flask, has_request_context, jsonify, session
 from flask_caching import Cache
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from dash_fda.analytics import rolling_mean, rolling_statistics
+from dash_fda.bundle import Bundle
 from dash_fda.constants import (
+    ANOMALY_THRESHOLD,
+    ANOMALY_WINDOW,
     APP_NAME,
+    ASSETS_MODE,
+    BUNDLE_DIR,
+    CACHE_THRESHOLD,
+    CACHE_TIMEOUT,
     DEBUG,
+    EWMA_SPAN,
+    FACET_MAX_TERMS,
+    FACET_WORKERS,
+    FALLBACK_META,
+    FAST_JSON_ENCODER,
+    INITIAL_URL,
+    PREFETCH_ENABLED,
+    PREFETCH_MAX_PENDING,
+    PREFETCH_WORKERS,
+    PROFILING_TOKEN,
+    RESPONSE_CACHE_BYTES,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_AGE,
     SECRET_KEY,
+    TIMELINE_MAX_POINTS,
+    UPSTREAM_TIMEOUT,
     URL_PREFIX,
 )
 from dash_fda.exceptions import ImproperlyConfigured
+from dash_fda.facets import NO_SELECTION, FacetCube, has_terms, is_filtered, toggle
+from dash_fda.httpcache import ResponseCache
+from dash_fda.prefetch import Prefetcher
+from dash_fda.profiling import profiler, timed
+from dash_fda.resilience import (
+    SingleFlight,
+    deadline,
+    is_stale,
+    last_good,
+    map_within_deadline,
+    mark_stale,
+    stale_scope,
+    with_deadline,
+)
+from dash_fda.timeline import downsample, zoom_range
 from dash_fda.utils import (
     create_intermediate_df,
+    create_daily,
     create_days,
     create_months,
     create_months_box,
     create_years,
+    get_meta,
     get_results,
     unjsonify,
 )
 
 
 # It would be cool to use Enum, but I don't think that's JSON-serializable.
-INITIAL_STATE = {"dateOfEvent": "", "dateReceived": "", "yearBegin": "", "yearEnd": ""}
+INITIAL_STATE = {
+    "dateOfEvent": "",
+    "dateReceived": "",
+    "yearBegin": "",
+    "yearEnd": "",
+    "stale": False,
+}
 
 
 STORE_ID = f"{APP_NAME.replace(' ', '-')}_store"
 
+DEVICE_CLASS = "device.openfda.device_class"
+
+EXTERNAL_STYLESHEETS = [
+    dbc.themes.SKETCHY,
+    "https://fonts.googleapis.com/css2?family=Roboto&family=Lobster&family=Raleway&display=swap",
+]
+
 
 server = Flask(APP_NAME)
 server.secret_key = SECRET_KEY
+if ASSETS_MODE == "bundle":
+    bundle = Bundle(BUNDLE_DIR)
+    external_stylesheets = bundle.stylesheets(EXTERNAL_STYLESHEETS)
+else:
+    bundle = None
+    external_stylesheets = EXTERNAL_STYLESHEETS
 # If serve_locally=False, serve Dash component libraries from a CDN.
 # https://dash.plotly.com/external-resources
 app = dash.Dash(
     name=APP_NAME,
     server=server,
-    serve_locally=False,
+    serve_locally=bundle is not None,
     title=APP_NAME,
-    external_stylesheets=[
-        dbc.themes.SKETCHY,
-        "https://fonts.googleapis.com/css2?family=Roboto&family=Lobster&family=Raleway&display=swap",
-    ],
+    external_stylesheets=external_stylesheets,
 )
+if bundle is not None:
+    bundle.init_app(app)
+if FAST_JSON_ENCODER:
+    dff.install_json_encoder()
 
 cache = Cache(
     app.server,
     config={
         "CACHE_TYPE": "filesystem",
         "CACHE_DIR": "cache",
-        "CACHE_THRESHOLD": 10,
-        "CACHE_DEFAULT_TIMEOUT": 30,
+        "CACHE_THRESHOLD": CACHE_THRESHOLD,
+        "CACHE_DEFAULT_TIMEOUT": CACHE_TIMEOUT,
     },
 )
 # app.config.supress_callback_exceptions = True
 
 
 def create_box(df, column):
-    return go.Box(name=column, y=df[column].values, boxmean=True)
+    return dff.box(name=column, y=df[column].values, boxmean=True)
+
+
+def create_moving_average(x, y, window=3):
+    return dff.scatter(
+        x=x,
+        y=rolling_mean(y, min(window, len(y))),
+        mode="lines",
+        line=dict(dash="dot"),
+        name=f"Moving average ({window} periods) of reports received",
+    )
+
+
+def create_spike_markers(x, y, spike_days):
+    """Mark the periods that contain at least one spike day."""
+    mask = spike_days > 0
+    return dff.scatter(
+        x=x[mask],
+        y=y[mask],
+        mode="markers",
+        marker=dict(symbol="x", size=12, color="crimson"),
+        text=[f"{n} spike days" for n in spike_days[mask]],
+        name="Spike days",
+    )
+
+
+def stale_title(title, stale):
+    """Flag the title of a chart built from stale openFDA results."""
+    if stale:
+        return f"{title} (stale data, openFDA is unavailable)"
+    return title
+
+
+def empty_figure(title, stale):
+    """Chart without data, e.g. when openFDA is down and nothing was fetched."""
+    return dff.figure(data=[], layout=dff.layout(title=stale_title(title, stale)))
+
+
+def describe_selection(selection):
+    """Human-readable summary of the cross-filter selection."""
+    parts = []
+    if selection["event_type"] is not None:
+        parts.append(f"event type {selection['event_type']}")
+    if selection["device_class"] is not None:
+        parts.append(f"device class {selection['device_class']}")
+    if selection["start"] is not None:
+        parts.append(f"{selection['start']} to {selection['end']}")
+    return ", ".join(parts)
+
+
+def selection_title(title, selection):
+    """Mention the cross-filter selection in the title of a chart."""
+    if is_filtered(selection):
+        return f"{title} ({describe_selection(selection)})"
+    return title
+
+
+def quote_term(value):
+    """Quote a term for an openFDA search (it may contain spaces)."""
+    return '"{}"'.format(value.replace(" ", "+"))
 
 
 def content():
     return html.Div(
         children=[
             dfc.year_range(),
+            dfc.cross_filter(),
             dfc.table(),
             dfc.device_manufacturer_form(),
             dfc.box_plot(),
+            dfc.timeline(),
             dfc.line_charts(),
             dfc.pie_charts(),
         ],
@@ -102,29 +225,41 @@ def serve_layout():
 app.layout = serve_layout
 
 
-@app.callback(
-    inputs=[Input("submit-button", "n_clicks")],
-    output=Output("table-fda", "data"),
-    state=[
-        State("year-slider", "value"),
-        State("manufacturer-dropdown", "value"),
-        State("medical-device-input", "value"),
-    ],
-)
-@cache.memoize(timeout=30)  # in seconds
-def update_table(n_clicks, year_range, manufacturer, device):
-    begin = "{}-01-01".format(year_range[0])
-    end = "{}-12-31".format(year_range[1])
+def not_stale(result):
+    """Do not cache results served from the stale fallback."""
+    return not result["stale"]
+
+
+@cache.memoize(response_filter=not_stale)
+@stale_scope()
+def fetch_table_rows(
+    year_begin,
+    year_end,
+    manufacturer,
+    device,
+    event_type=None,
+    device_class=None,
+    start=None,
+    end=None,
+):
+    """Fetch the raw reports (the only data the facet cube cannot provide)."""
+    begin = start or "{}-01-01".format(year_begin)
+    end = end or "{}-12-31".format(year_end)
     limit = 100
+    search = f"date_received:[{begin}+TO+{end}]+AND+device.manufacturer_d_name:{manufacturer}+AND+device.generic_name:{device}"
+    if event_type is not None:
+        search += f"+AND+event_type:{quote_term(event_type)}"
+    if device_class is not None:
+        search += f"+AND+{DEVICE_CLASS}:{quote_term(device_class)}"
     url = f"""
-    {URL_PREFIX}&search=date_received:[{begin}+TO+{end}]+AND+device.manufacturer_d_name:{manufacturer}+AND+device.generic_name:{device}&limit={limit}&skip=0
+    {URL_PREFIX}&search={search}&limit={limit}&skip=0
     """
     results = get_results(url)
     # print("=== URL ===", url)
     # print("=== RESULTS[0] ===", results[0])
 
     # TODO: it seems that most of the info is in the mdr_text field (a list)
-    data = list()
+    rows = list()
     for res in results:
         try:
             res["mdr_text"]
@@ -138,19 +273,15 @@ def update_table(n_clicks, year_range, manufacturer, device):
             "Reporter": res["reporter_occupation_code"],
             "Has MDR Text": yes_or_no,
         }
-        data.append(d)
-    return data
+        rows.append(d)
+    return {"rows": rows, "stale": is_stale()}
 
 
-@app.callback(
-    inputs=[Input("year-slider", "value")],
-    output=Output(STORE_ID, "data"),
-)
-# @cache.memoize(timeout=30)  # in seconds
-def set_data_in_store(year_range):
-    """Update the app store when the slider changes."""
-    begin = "{}-01-01".format(year_range[0])
-    end = "{}-12-31".format(year_range[1])
+@cache.memoize(response_filter=not_stale)
+@stale_scope()
+def fetch_store_data(year_begin, year_end):
+    begin = "{}-01-01".format(year_begin)
+    end = "{}-12-31".format(year_end)
 
     url_a = (
         "{url_prefix}&search=date_of_event:[{date_begin}+TO+{date_end}]"
@@ -171,40 +302,428 @@ def set_data_in_store(year_range):
     return {
         "dateOfEvent": df_a.to_json(),
         "dateReceived": df_b.to_json(),
-        "yearBegin": f"{year_range[0]}",
-        "yearEnd": f"{year_range[-1]}",
+        "yearBegin": f"{year_begin}",
+        "yearEnd": f"{year_end}",
+        "stale": is_stale(),
+    }
+
+
+@cache.memoize(response_filter=not_stale)
+@stale_scope()
+def fetch_term_counts(year_begin, year_end, field, start=None, end=None):
+    """Count the reports received in the year range (or in the date window
+    from start to end) by each term of field."""
+    begin = start or "{}-01-01".format(year_begin)
+    end = end or "{}-12-31".format(year_end)
+    url = f"""
+    {URL_PREFIX}&search=date_received:[{begin}+TO+{end}]&count={field}
+    """
+    results = get_results(url)
+    return {
+        "labels": [r["term"] for r in results],
+        "values": [r["count"] for r in results],
+        "stale": is_stale(),
     }
 
 
+def daily_counts(df):
+    """Reports each day (a date-indexed Series) of a DataFrame of openFDA counts.
+
+    Without results (openFDA failed and there were no last good ones) the
+    series is empty.
+    """
+    if df.empty:
+        return pd.Series([], index=pd.DatetimeIndex([]), dtype=float)
+    return create_daily(df)["count"]
+
+
+@cache.memoize(response_filter=not_stale)
+@stale_scope()
+def daily_report_analytics(year_begin, year_end):
+    """Moving statistics of the reports received each day in the year range."""
+    store = fetch_store_data(year_begin, year_end)
+    stats = rolling_statistics(
+        daily_counts(unjsonify(store, "dateReceived")),
+        window=ANOMALY_WINDOW,
+        span=EWMA_SPAN,
+        threshold=ANOMALY_THRESHOLD,
+    )
+    return {"stats": stats, "stale": store["stale"]}
+
+
+@cache.memoize(response_filter=not_stale)
+@stale_scope()
+def fetch_history():
+    """The reports received each day, over the whole openFDA history."""
+    df = create_intermediate_df(f"{URL_PREFIX}&count=date_received")
+    return {"daily": daily_counts(df), "stale": is_stale()}
+
+
+# the callbacks that need the same facet cube share a single build
+facet_builds = SingleFlight()
+
+
+@cache.memoize(response_filter=not_stale)
+@stale_scope()
+def fetch_facet_cube(year_begin, year_end):
+    """Facet cube of the reports received in the year range.
+
+    It takes one openFDA request for each pair of event type and device class,
+    but then every cross-filter selection is computed from it in memory. A
+    click updates the selection, both pies and the store-fed charts at once:
+    they wait for the same build of the cube rather than each starting one.
+    """
+    facets = facet_builds.do(
+        (year_begin, year_end), partial(build_facet_cube, year_begin, year_end)
+    )
+    if facets["stale"]:
+        # built in another thread, which flagged itself as stale
+        mark_stale()
+    return facets
+
+
+def build_facet_cube(year_begin, year_end):
+    """Fetch the daily counts of every pair of terms, and build the cube."""
+    event_types = fetch_term_counts(year_begin, year_end, "event_type")
+    device_classes = fetch_term_counts(year_begin, year_end, DEVICE_CLASS)
+    pairs = [
+        (event_type, device_class)
+        for event_type in event_types["labels"][:FACET_MAX_TERMS]
+        for device_class in device_classes["labels"][:FACET_MAX_TERMS]
+    ]
+    begin = "{}-01-01".format(year_begin)
+    end = "{}-12-31".format(year_end)
+
+    def count_daily(pair):
+        event_type, device_class = pair
+        url = f"""
+        {URL_PREFIX}&search=date_received:[{begin}+TO+{end}]+AND+event_type:{quote_term(event_type)}+AND+{DEVICE_CLASS}:{quote_term(device_class)}&count=date_received
+        """
+        # the daily rows of every pair are large: remember the cube instead
+        return get_results(url, remember=False)
+
+    results = map_within_deadline(count_daily, pairs, FACET_WORKERS)
+    last_day = min(pd.Timestamp(end), pd.Timestamp(datetime.date.today()))
+    cube = FacetCube.from_results(
+        dates=pd.date_range(begin, last_day, freq="D"),
+        event_types=event_types["labels"][:FACET_MAX_TERMS],
+        device_classes=device_classes["labels"][:FACET_MAX_TERMS],
+        results=dict(zip(pairs, results)),
+    )
+    # a pair that failed (or ran out of time) has zeros in the cube: serve the
+    # last good cube instead, if any. Either way it is stale, and not cached.
+    stale = is_stale() or event_types["stale"] or device_classes["stale"]
+    key = ("facets", year_begin, year_end)
+    if stale:
+        cube = last_good.recall(key, default=cube)
+    else:
+        last_good.remember(key, cube, cube.nbytes)
+    return {"cube": cube, "stale": stale}
+
+
+def state_cube(state):
+    """Facet cube for the year range of the app store."""
+    return fetch_facet_cube(int(state["yearBegin"]), int(state["yearEnd"]))
+
+
+@timed("aggregate")
+def state_analytics(state, selection=None):
+    """Daily report analytics for the year range of the app store.
+
+    The statistics are computed on the daily counts of all the reports, or of
+    the selected terms, then cut to the selected dates (so that the moving
+    windows at the start of the selection are complete).
+    """
+    selection = selection or NO_SELECTION
+    if not has_terms(selection):
+        analytics = daily_report_analytics(
+            int(state["yearBegin"]), int(state["yearEnd"])
+        )
+        stats, stale = analytics["stats"], analytics["stale"]
+    else:
+        facets = state_cube(state)
+        daily = facets["cube"].daily(
+            event_type=selection["event_type"], device_class=selection["device_class"]
+        )
+        stats = rolling_statistics(
+            daily,
+            window=ANOMALY_WINDOW,
+            span=EWMA_SPAN,
+            threshold=ANOMALY_THRESHOLD,
+        )
+        stale = facets["stale"]
+    if selection["start"] is not None or selection["end"] is not None:
+        stats = stats.loc[selection["start"] : selection["end"]]
+    return {"stats": stats, "stale": stale}
+
+
+def date_window(df, selection):
+    """Rows of a store DataFrame (time column, YYYYMMDD) in the selected dates."""
+    start, end = selection["start"], selection["end"]
+    if df.empty or (start is None and end is None):
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["time"].astype(str) >= start.replace("-", "")
+    if end is not None:
+        mask &= df["time"].astype(str) <= end.replace("-", "")
+    return df[mask].reset_index(drop=True)
+
+
+@timed("aggregate")
+def received_counts(state, selection):
+    """Reports received each day (columns time and count, as in the store)."""
+    selection = selection or NO_SELECTION
+    if not has_terms(selection):
+        return date_window(unjsonify(state, "dateReceived"), selection)
+    daily = state_cube(state)["cube"].daily(**selection)
+    return pd.DataFrame({"time": daily.index.strftime("%Y%m%d"), "count": daily.values})
+
+
+@timed("aggregate")
+def report_counts(state, selection):
+    """Reports each day by date of event (A) and by date received (B).
+
+    The facet cube only counts reports by date received: when the selection
+    has terms there is no column A. Neither is there when openFDA failed to
+    count the reports by date of event (and there were no last good results).
+    """
+    df_b = received_counts(state, selection).rename(columns={"count": "B"})
+    if has_terms(selection):
+        return df_b
+    df_a = unjsonify(state, "dateOfEvent").rename(columns={"count": "A"})
+    if df_a.empty or df_b.empty:
+        return df_b
+    return pd.merge(df_a, df_b, on="time")
+
+
+def report_traces(df):
+    traces = []
+    if "A" in df:
+        traces.append(
+            dff.scatter(
+                x=df.index.values,
+                y=df.A,
+                mode="lines",
+                name="Onset of the adverse event",
+            )
+        )
+    traces.append(
+        dff.scatter(
+            x=df.index.values,
+            y=df["B"],
+            mode="lines+markers",
+            name="Report received by FDA",
+        )
+    )
+    return traces
+
+
+def warm_cache(key):
+    """Fetch (and cache) everything needed to render a slider position."""
+    year_begin, year_end, manufacturer, device = key
+    with deadline():
+        fetch_store_data(year_begin, year_end)
+        fetch_term_counts(year_begin, year_end, "event_type")
+        fetch_term_counts(year_begin, year_end, DEVICE_CLASS)
+        fetch_table_rows(year_begin, year_end, manufacturer, device)
+        daily_report_analytics(year_begin, year_end)
+        fetch_history()
+
+
+prefetcher = Prefetcher(
+    warm=warm_cache,
+    bounds=dfc.year_bounds,
+    max_workers=PREFETCH_WORKERS,
+    max_pending=PREFETCH_MAX_PENDING,
+    ttl=CACHE_TIMEOUT,
+    enabled=PREFETCH_ENABLED,
+)
+
+
+def session_id():
+    """Identify the browser session (None outside of an HTTP request)."""
+    if not has_request_context():
+        return None
+    if "sid" not in session:
+        session["sid"] = os.urandom(16).hex()
+    return session["sid"]
+
+
+@server.route("/_prefetch-stats")
+def prefetch_stats():
+    return jsonify(prefetcher.stats())
+
+
+def dataset_version():
+    """Date of the last update of openFDA, or None while it is unknown.
+
+    The response cache calls it in the background, every CACHE_TIMEOUT seconds.
+    """
+    with deadline(UPSTREAM_TIMEOUT):
+        version = get_meta(INITIAL_URL)["last_updated"]
+    # the placeholder used while openFDA is down is not a version
+    return None if version == FALLBACK_META["last_updated"] else version
+
+
+response_cache = ResponseCache(
+    max_bytes=RESPONSE_CACHE_BYTES,
+    version=dataset_version,
+    version_ttl=CACHE_TIMEOUT,
+    max_age=RESPONSE_CACHE_MAX_AGE,
+    # set_data_in_store tells the prefetcher where each session is: it must run
+    exclude=[f"{STORE_ID}.data"],
+    enabled=RESPONSE_CACHE_ENABLED,
+)
+response_cache.init_app(app)
+profiler.init_app(app, token=PROFILING_TOKEN)
+
+
+@server.route("/_response-cache-stats")
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+
+@app.callback(
+    inputs=[
+        Input("submit-button", "n_clicks"),
+        Input("facet-selection", "data"),
+    ],
+    output=[Output("table-fda", "data"), Output("table-fda-status", "children")],
+    state=[
+        State("year-slider", "value"),
+        State("manufacturer-dropdown", "value"),
+        State("medical-device-input", "value"),
+    ],
+)
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_table(n_clicks, selection, year_range, manufacturer, device):
+    selection = selection or NO_SELECTION
+    result = fetch_table_rows(
+        year_range[0], year_range[1], manufacturer, device, **selection
+    )
+    if result["stale"]:
+        status = "Stale data: openFDA is currently unavailable."
+    else:
+        status = ""
+    return result["rows"], status
+
+
 @app.callback(
     inputs=[Input("year-slider", "value")],
-    output=Output("pie-event", "figure"),
+    output=Output(STORE_ID, "data"),
+    state=[
+        State("manufacturer-dropdown", "value"),
+        State("medical-device-input", "value"),
+    ],
 )
-# @cache.memoize(timeout=30)  # in seconds (pickle.dump fails)
-def update_pie_event(year_range):
-    begin = "{}-01-01".format(year_range[0])
-    end = "{}-12-31".format(year_range[1])
-    url = f"""
-    {URL_PREFIX}&search=date_received:[{begin}+TO+{end}]&count=event_type
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def set_data_in_store(year_range, manufacturer, device):
+    """Update the app store when the slider changes."""
+    prefetcher.observe(session_id(), year_range, manufacturer, device)
+    return fetch_store_data(year_range[0], year_range[1])
+
+
+@app.callback(
+    inputs=[
+        Input("pie-event", "clickData"),
+        Input("pie-device", "clickData"),
+        Input("line-chart-daily", "relayoutData"),
+        Input("clear-filters", "n_clicks"),
+        Input("year-slider", "value"),
+    ],
+    output=[
+        Output("facet-selection", "data"),
+        Output("cross-filter-status", "children"),
+    ],
+    state=[State("facet-selection", "data")],
+)
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_selection(
+    event_click, device_click, daily_relayout, n_clicks, year_range, selection
+):
+    """Update the cross-filter selection shared by the charts."""
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    selection = dict(NO_SELECTION, **(selection or {}))
+    if "clear-filters.n_clicks" in triggered:
+        selection = dict(NO_SELECTION)
+    elif "pie-event.clickData" in triggered:
+        label = event_click["points"][0]["label"]
+        selection = toggle(selection, "event_type", label)
+    elif "pie-device.clickData" in triggered:
+        label = device_click["points"][0]["label"]
+        selection = toggle(selection, "device_class", label)
+    elif "line-chart-daily.relayoutData" in triggered:
+        x_range = zoom_range(daily_relayout)
+        if x_range is None:
+            raise PreventUpdate
+        start, end = (None if x is None else x.strftime("%Y-%m-%d") for x in x_range)
+        selection["start"], selection["end"] = start, end
+    elif "year-slider.value" in triggered:
+        # a date window of the previous year range makes no sense in the new one
+        selection["start"], selection["end"] = None, None
+    else:
+        raise PreventUpdate
+
+    if not is_filtered(selection):
+        return selection, ""
+    if has_terms(selection):
+        # build the cube once, here, rather than in every chart that needs it
+        fetch_facet_cube(year_range[0], year_range[1])
+    return selection, f"Filtered by {describe_selection(selection)}."
+
+
+@timed("aggregate")
+def term_counts(year_range, selection, dimension, field):
+    """Labels and counts of the terms of a pie chart, and whether they are stale.
+
+    Without a selected term they come straight from openFDA (for the selected
+    dates, if any), otherwise from the facet cube, with the selected slice
+    pulled out of the pie.
     """
-    results = get_results(url)
-    labels = [r["term"] for r in results]
-    values = [r["count"] for r in results]
+    selection = selection or NO_SELECTION
+    if not has_terms(selection):
+        return fetch_term_counts(
+            year_range[0], year_range[1], field, selection["start"], selection["end"]
+        )
+    facets = fetch_facet_cube(year_range[0], year_range[1])
+    labels, values = facets["cube"].totals(dimension, **selection)
+    pull = [0.1 if label == selection[dimension] else 0 for label in labels]
+    return {"labels": labels, "values": values, "pull": pull, "stale": facets["stale"]}
+
+
+@app.callback(
+    inputs=[Input("year-slider", "value"), Input("facet-selection", "data")],
+    output=Output("pie-event", "figure"),
+)
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_pie_event(year_range, selection=None):
+    counts = term_counts(year_range, selection, "event_type", "event_type")
 
     data = [
-        go.Pie(
+        dff.pie(
             name="Event Type",
-            values=values,
-            labels=labels,
+            values=counts["values"],
+            labels=counts["labels"],
             hoverinfo="label + percent + name",
             hole=0.45,
+            pull=counts.get("pull"),
             # showlegend=False,
         )
     ]
-    layout = go.Layout(
+    title = selection_title("Adverse Event Type", selection)
+    layout = dff.layout(
         autosize=True,
         hovermode="closest",
-        title="Adverse Event Type",
+        title=stale_title(title, counts["stale"]),
         font=dict(
             # family="Courier New, monospace",
             family="Lobster",
@@ -214,153 +733,260 @@ def update_pie_event(year_range):
             color="RebeccaPurple",
         ),
     )
-    return go.Figure(data=data, layout=layout)
+    return dff.figure(data=data, layout=layout)
 
 
-# @cache.memoize()  # if placed here, it seems to work
 @app.callback(
-    inputs=[Input("year-slider", "value")],
+    inputs=[Input("year-slider", "value"), Input("facet-selection", "data")],
     output=Output("pie-device", "figure"),
 )
-# @cache.memoize()  # if placed here, pickle.dump fails
-def update_pie_device(year_range):
-    begin = "{}-01-01".format(year_range[0])
-    end = "{}-12-31".format(year_range[1])
-    url = f"""
-    {URL_PREFIX}&search=date_received:[{begin}+TO+{end}]&count=device.openfda.device_class
-    """
-    results = get_results(url)
-    labels = [r["term"] for r in results]
-    values = [r["count"] for r in results]
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_pie_device(year_range, selection=None):
+    counts = term_counts(year_range, selection, "device_class", DEVICE_CLASS)
 
     data = [
-        go.Pie(
+        dff.pie(
             name="Device Class",
-            values=values,
-            labels=labels,
+            values=counts["values"],
+            labels=counts["labels"],
             hoverinfo="label + percent + name",
             hole=0.45,
+            pull=counts.get("pull"),
         )
     ]
-    layout = go.Layout(
+    title = selection_title("Medical Device Class", selection)
+    layout = dff.layout(
         autosize=True,
         hovermode="closest",
-        title="Medical Device Class",
+        title=stale_title(title, counts["stale"]),
     )
-    return go.Figure(data=data, layout=layout)
+    return dff.figure(data=data, layout=layout)
 
 
 @app.callback(
-    inputs=[Input(STORE_ID, "data")],
+    inputs=[Input(STORE_ID, "data"), Input("facet-selection", "data")],
     output=Output("line-chart-year", "figure"),
 )
-def update_line_chart_by_year(state):
-    df_a = unjsonify(state, "dateOfEvent")
-    df_a.rename(columns={"count": "A"}, inplace=True)
-
-    df_b = unjsonify(state, "dateReceived")
-    df_b.rename(columns={"count": "B"}, inplace=True)
-
-    df_merged = pd.merge(df_a, df_b, on="time")
-    df = create_years(df_merged)
-
-    data = [
-        go.Scatter(
-            x=df.index.values, y=df.A, mode="lines", name="Onset of the adverse event"
-        ),
-        go.Scatter(
-            x=df.index.values,
-            y=df["B"],
-            mode="lines+markers",
-            name="Report received by FDA",
-        ),
-    ]
-
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_line_chart_by_year(state, selection=None):
     y0 = state["yearBegin"]
     y1 = state["yearEnd"]
-    title = f"Adverse event reports by year [{y0} - {y1}]"
-    layout = go.Layout(title=title)
-    return go.Figure(data=data, layout=layout)
+    title = selection_title(f"Adverse event reports by year [{y0} - {y1}]", selection)
+    stale = state.get("stale", False)
+    df = report_counts(state, selection)
+    if df.empty:
+        return empty_figure(title, stale)
+    df = create_years(df)
+
+    anomaly = state_analytics(state, selection)["stats"]["anomaly"]
+    anomaly = anomaly.resample("Y").sum()
+    anomaly.index = anomaly.index.strftime("%Y")
+    spike_days = anomaly.reindex(df.index, fill_value=0).values
+
+    data = report_traces(df) + [
+        create_moving_average(df.index.values, df["B"].values),
+        create_spike_markers(df.index.values, df["B"].values, spike_days),
+    ]
+
+    layout = dff.layout(title=stale_title(title, stale))
+    return dff.figure(data=data, layout=layout)
 
 
 @app.callback(
-    inputs=[Input(STORE_ID, "data")],
+    inputs=[Input(STORE_ID, "data"), Input("facet-selection", "data")],
     output=Output("line-chart-month", "figure"),
 )
-def update_line_chart_by_month(state):
-    df_a = unjsonify(state, "dateOfEvent")
-    df_a.rename(columns={"count": "A"}, inplace=True)
-    df_b = unjsonify(state, "dateReceived")
-    df_b.rename(columns={"count": "B"}, inplace=True)
-
-    df_merged = pd.merge(df_a, df_b, on="time")
-    df = create_months(df_merged)
-
-    data = [
-        go.Scatter(
-            x=df.index.values, y=df.A, mode="lines", name="Onset of the adverse event"
-        ),
-        go.Scatter(
-            x=df.index.values,
-            y=df["B"],
-            mode="lines+markers",
-            name="Report received by FDA",
-        ),
-    ]
-
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_line_chart_by_month(state, selection=None):
     y0 = state["yearBegin"]
     y1 = state["yearEnd"]
-    title = f"Adverse event reports by month [{y0} - {y1}]"
-    layout = go.Layout(title=title)
-    return go.Figure(data=data, layout=layout)
+    title = selection_title(f"Adverse event reports by month [{y0} - {y1}]", selection)
+    stale = state.get("stale", False)
+    df = report_counts(state, selection)
+    if df.empty:
+        return empty_figure(title, stale)
+    df = create_months(df)
+
+    anomaly = state_analytics(state, selection)["stats"]["anomaly"]
+    anomaly = anomaly.groupby(anomaly.index.strftime("%B")).sum()
+    spike_days = anomaly.reindex(df.index, fill_value=0).values
+
+    data = report_traces(df) + [
+        create_moving_average(df.index.values, df["B"].values),
+        create_spike_markers(df.index.values, df["B"].values, spike_days),
+    ]
+
+    layout = dff.layout(title=stale_title(title, stale))
+    return dff.figure(data=data, layout=layout)
 
 
 @app.callback(
-    inputs=[Input(STORE_ID, "data")],
+    inputs=[Input(STORE_ID, "data"), Input("facet-selection", "data")],
     output=Output("box-plot-month", "figure"),
 )
-def update_box_plot_by_month(state):
-    df_b = unjsonify(state, "dateReceived")
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_box_plot_by_month(state, selection=None):
+    title = selection_title("", selection)
+    stale = state.get("stale", False)
+    df_b = received_counts(state, selection)
+    if df_b.empty:
+        return empty_figure(title, stale)
     df = create_months_box(df_b)
 
     func = partial(create_box, df)
     boxes = list(map(func, df.columns))
 
     data = boxes
-    layout = go.Layout(title="")
-    return go.Figure(data=data, layout=layout)
+    layout = dff.layout(title=stale_title(title, stale))
+    return dff.figure(data=data, layout=layout)
 
 
 @app.callback(
-    inputs=[Input(STORE_ID, "data")],
+    inputs=[Input(STORE_ID, "data"), Input("facet-selection", "data")],
     output=Output("line-chart-day", "figure"),
 )
-def update_line_chart_by_day(state):
-    df_a = unjsonify(state, "dateOfEvent")
-    df_a.rename(columns={"count": "A"}, inplace=True)
-    df_b = unjsonify(state, "dateReceived")
-    df_b.rename(columns={"count": "B"}, inplace=True)
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_line_chart_by_day(state, selection=None):
+    y0 = state["yearBegin"]
+    y1 = state["yearEnd"]
+    title = selection_title(f"Adverse event reports by day [{y0} - {y1}]", selection)
+    stale = state.get("stale", False)
+    df = report_counts(state, selection)
+    if df.empty:
+        return empty_figure(title, stale)
+    df = create_days(df)
+
+    data = report_traces(df)
 
-    df_merged = pd.merge(df_a, df_b, on="time")
-    df = create_days(df_merged)
+    layout = dff.layout(title=stale_title(title, stale))
+    return dff.figure(data=data, layout=layout)
+
+
+@app.callback(
+    inputs=[Input(STORE_ID, "data"), Input("facet-selection", "data")],
+    output=Output("line-chart-daily", "figure"),
+)
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_line_chart_daily(state, selection=None):
+    y0 = state["yearBegin"]
+    y1 = state["yearEnd"]
+    title = f"Adverse event reports received each day [{y0} - {y1}]"
+    title = selection_title(title, selection)
+    analytics = state_analytics(state, selection)
+    stale = state.get("stale", False) or analytics["stale"]
+    df = analytics["stats"]
+    if df.empty:
+        return empty_figure(title, stale)
+    x = df.index
+    spikes = df[df.anomaly]
 
     data = [
-        go.Scatter(
-            x=df.index.values, y=df.A, mode="lines", name="Onset of the adverse event"
+        dff.scatter(
+            x=x,
+            y=df["lower"],
+            mode="lines",
+            line=dict(width=0),
+            hoverinfo="skip",
+            showlegend=False,
         ),
-        go.Scatter(
-            x=df.index.values,
-            y=df["B"],
-            mode="lines+markers",
-            name="Report received by FDA",
+        dff.scatter(
+            x=x,
+            y=df["upper"],
+            mode="lines",
+            line=dict(width=0),
+            fill="tonexty",
+            fillcolor="rgba(102, 51, 153, 0.15)",
+            name=f"Mean ± {ANOMALY_THRESHOLD:g} std ({ANOMALY_WINDOW} days)",
+        ),
+        dff.scatter(x=x, y=df["count"], mode="lines", name="Report received by FDA"),
+        dff.scatter(
+            x=x,
+            y=df["mean"],
+            mode="lines",
+            name=f"Moving average ({ANOMALY_WINDOW} days)",
+        ),
+        dff.scatter(
+            x=x,
+            y=df["ewma"],
+            mode="lines",
+            line=dict(dash="dot"),
+            name=f"EWMA (span {EWMA_SPAN} days)",
+        ),
+        dff.scatter(
+            x=spikes.index,
+            y=spikes["count"],
+            mode="markers",
+            marker=dict(symbol="x", size=10, color="crimson"),
+            text=[f"z-score: {z:.1f}" for z in spikes["zscore"]],
+            name="Spike days",
         ),
     ]
 
-    y0 = state["yearBegin"]
-    y1 = state["yearEnd"]
-    title = f"Adverse event reports by day [{y0} - {y1}]"
-    layout = go.Layout(title=title)
-    return go.Figure(data=data, layout=layout)
+    layout = dff.layout(title=stale_title(title, stale), hovermode="x")
+    return dff.figure(data=data, layout=layout)
+
+
+app.clientside_callback(
+    """
+    function(id) {
+        var graph = document.getElementById(id);
+        return graph ? graph.offsetWidth : window.innerWidth;
+    }
+    """,
+    Output("timeline-width", "data"),
+    [Input("timeline", "id")],
+)
+
+
+@app.callback(
+    inputs=[Input("timeline-width", "data"), Input("timeline", "relayoutData")],
+    output=Output("timeline", "figure"),
+)
+@profiler.profile
+@prefetcher.foreground
+@with_deadline()
+def update_timeline(width, relayout_data):
+    """Plot the whole history, and the visible window at full resolution.
+
+    The graph never receives more points than it has pixels: on a zoom or a
+    pan only the visible window is downsampled again, from the cached series.
+    """
+    x_range = zoom_range(relayout_data)
+    triggered = [t["prop_id"] for t in dash.callback_context.triggered]
+    if x_range is None and "timeline.relayoutData" in triggered:
+        raise PreventUpdate
+    points = min(int(width or 1000), TIMELINE_MAX_POINTS)
+
+    history = fetch_history()
+    daily = downsample(history["daily"], points, x_range or (None, None))
+    data = [
+        dff.scatter(
+            x=daily.index,
+            y=daily.values,
+            mode="lines",
+            name="Report received by FDA",
+        )
+    ]
+    title = "Adverse event reports received each day"
+    layout = dff.layout(
+        title=stale_title(title, history["stale"]),
+        hovermode="x",
+        # keep the zoom of the user when the figure is replaced
+        uirevision="timeline",
+    )
+    return dff.figure(data=data, layout=layout)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+from .bundle import (
+    Bundle,
+    async_chunks,
+    build,
+    chunk_urls,
+    css_references,
+    measure_first_load,
+)
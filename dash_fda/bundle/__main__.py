@@ -0,0 +1,43 @@
+"""Build the self-hosted asset bundle, or measure the first load of the app.
+
+    python -m dash_fda.bundle build [--out DIR]
+    python -m dash_fda.bundle measure URL [URL ...]
+
+To compare the two asset modes, run the app twice (ASSETS_MODE=cdn and
+ASSETS_MODE=bundle, on different ports) and measure both URLs.
+"""
+import argparse
+import json
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m dash_fda.bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="vendor all the assets")
+    build_parser.add_argument("--out", help="bundle directory (default: BUNDLE_DIR)")
+    measure_parser = commands.add_parser("measure", help="measure the first load")
+    measure_parser.add_argument("urls", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        # the app must not look for the bundle we are about to build
+        os.environ["ASSETS_MODE"] = "cdn"
+        from dash.development.base_component import ComponentRegistry
+        from dash_fda.app import EXTERNAL_STYLESHEETS
+        from dash_fda.bundle import build
+        from dash_fda.constants import BUNDLE_DIR
+
+        packages = ["dash_renderer"] + sorted(ComponentRegistry.registry)
+        manifest = build(args.out or BUNDLE_DIR, EXTERNAL_STYLESHEETS, packages)
+        print(f"Bundled {len(manifest['static'])} static files", end=" ")
+        print(f"and {len(manifest['suites'])} component files")
+    else:
+        from dash_fda.bundle import measure_first_load
+
+        for url in args.urls:
+            print(url, json.dumps(measure_first_load(url), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+import gzip
+import hashlib
+import importlib
+import json
+import logging
+import mimetypes
+import os
+import pkgutil
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+import requests
+from dash.fingerprint import check_fingerprint
+from flask import request, send_from_directory
+from dash_fda.exceptions import ImproperlyConfigured
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+STATIC_DIR = "static"
+SUITES_DIR = "_dash-component-suites"
+
+# Google Fonts picks the font format from the User-Agent: ask for woff2.
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/85.0.4183.102 Safari/537.36"
+)
+
+# Fingerprinted files never change, so browsers may cache them forever.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# File extension of the precompressed variants, by content-coding.
+_EXTENSIONS = {"br": "br", "gzip": "gz"}
+
+CSS_IMPORT = re.compile(r"""@import\s+(["'])(.+?)\1""")
+CSS_URL = re.compile(r"""url\(\s*(["']?)([^"')]+)\1\s*\)""")
+
+
+def css_references(text):
+    """URLs referenced by a stylesheet, through @import or url()."""
+    refs = [m.group(2) for m in CSS_IMPORT.finditer(text)]
+    refs += [m.group(2) for m in CSS_URL.finditer(text)]
+    return [r for r in refs if not r.startswith(("data:", "#"))]
+
+
+def _encodings(data):
+    """Compressed variants of data, keyed by content-coding."""
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    # a variant that does not save anything is not worth serving
+    return {k: v for k, v in variants.items() if len(v) < len(data)}
+
+
+def _write(directory, name, data):
+    """Write data and its compressed variants. Return the variants written."""
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    variants = _encodings(data)
+    for coding, payload in variants.items():
+        with open(f"{path}.{_EXTENSIONS[coding]}", "wb") as f:
+            f.write(payload)
+    return sorted(variants)
+
+
+def _package_paths(resources):
+    """All the package-relative paths listed in a _js_dist/_css_dist list."""
+    paths = []
+    for resource in resources:
+        for key in ("relative_package_path", "dev_package_path"):
+            value = resource.get(key, [])
+            if isinstance(value, dict):
+                value = [p for v in value.values() for p in v]
+            elif isinstance(value, str):
+                value = [value]
+            paths.extend(p for p in value if p not in paths)
+    return paths
+
+
+class _StylesheetVendor:
+    """Download stylesheets and everything they reference (imports, fonts).
+
+    Each file is saved under a fingerprinted name (content hash), and the
+    references in the stylesheets are rewritten to point to those names.
+    """
+
+    def __init__(self, directory, session):
+        self.directory = directory
+        self.session = session
+        self.names = {}
+        self.files = {}
+
+    def vendor(self, url):
+        if url in self.names:
+            return self.names[url]
+        response = self.session.get(url, timeout=30)
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        data = response.content
+        if content_type.startswith("text/css") or url.endswith(".css"):
+            data = self._rewrite(url, data.decode("utf-8")).encode("utf-8")
+            extension = ".css"
+        else:
+            extension = mimetypes.guess_extension(content_type.split(";")[0]) or ""
+
+        name = self._fingerprinted_name(url, data, extension)
+        self.files[name] = _write(self.directory, name, data)
+        self.names[url] = name
+        return name
+
+    def _rewrite(self, url, text):
+        """Point the references of the stylesheet at url to vendored files."""
+
+        def replace(match):
+            ref = match.group(2)
+            if ref.startswith(("data:", "#")):
+                return match.group(0)
+            # every file is in the same directory: the name is a relative URL
+            return match.group(0).replace(ref, self.vendor(urljoin(url, ref)))
+
+        text = CSS_IMPORT.sub(replace, text)
+        return CSS_URL.sub(replace, text)
+
+    @staticmethod
+    def _fingerprinted_name(url, data, extension):
+        basename = os.path.basename(urlparse(url).path) or "index"
+        basename = re.sub(r"[^\w.-]", "_", basename)
+        stem, dot, ext = basename.rpartition(".")
+        if not dot:
+            stem, ext = basename, extension.lstrip(".")
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        return f"{stem}.{digest}.{ext}" if ext else f"{stem}.{digest}"
+
+
+def build(directory, stylesheets, packages):
+    """Vendor the stylesheets and Dash component bundles into directory.
+
+    stylesheets: URLs of the external stylesheets of the app.
+    packages: names of the Dash component packages (dash_renderer included).
+    """
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    manifest = {"stylesheets": {}, "static": {}, "suites": {}, "packages": {}}
+
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    vendor = _StylesheetVendor(os.path.join(directory, STATIC_DIR), session)
+    for url in stylesheets:
+        manifest["stylesheets"][url] = vendor.vendor(url)
+    manifest["static"] = vendor.files
+
+    suites_dir = os.path.join(directory, SUITES_DIR)
+    for package_name in packages:
+        module = importlib.import_module(package_name)
+        manifest["packages"][package_name] = module.__version__
+        resources = getattr(module, "_js_dist", []) + getattr(module, "_css_dist", [])
+        resources += getattr(module, "_js_dist_dependencies", [])
+        for path in _package_paths(resources):
+            try:
+                data = pkgutil.get_data(package_name, path)
+            except OSError:
+                # some packages list files (e.g. source maps) they do not ship
+                logger.debug("%s/%s not found, skipped", package_name, path)
+                continue
+            key = f"{package_name}/{path}"
+            manifest["suites"][key] = _write(suites_dir, key, data)
+
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Bundle:
+    """Serve the vendored assets of a bundle built with `build`.
+
+    Stylesheets and fonts are served under /_bundle/ with their fingerprinted
+    names. Dash component bundles keep their usual /_dash-component-suites/
+    URLs (Dash fingerprints them already), but are answered from the
+    precompressed files of the bundle when the browser accepts them.
+    """
+
+    def __init__(self, directory):
+        path = os.path.join(directory, MANIFEST)
+        if not os.path.isfile(path):
+            raise ImproperlyConfigured(
+                f"No asset bundle in {directory}: run `python -m dash_fda.bundle build`"
+            )
+        self.directory = directory
+        with open(path) as f:
+            self.manifest = json.load(f)
+
+    def stylesheets(self, urls, url_prefix="/"):
+        """The bundled replacements of the external stylesheets urls."""
+        missing = [url for url in urls if url not in self.manifest["stylesheets"]]
+        if missing:
+            raise ImproperlyConfigured(
+                f"Stylesheets missing from the bundle: {missing}"
+            )
+        return [
+            f"{url_prefix}_bundle/{self.manifest['stylesheets'][url]}" for url in urls
+        ]
+
+    def init_app(self, app):
+        """Register the routes that serve the bundle on the Dash app."""
+        server = app.server
+        prefix = app.config.routes_pathname_prefix
+        suites_prefix = f"{prefix}{SUITES_DIR}/"
+        suites = self._current_suites()
+
+        @server.route(f"{prefix}_bundle/<path:filename>")
+        def serve_bundle(filename):
+            if filename not in self.manifest["static"]:
+                return "Not found", 404
+            directory = os.path.join(self.directory, STATIC_DIR)
+            encodings = self.manifest["static"][filename]
+            return self._send(directory, filename, encodings, immutable=True)
+
+        @server.before_request
+        def serve_precompressed_suite():
+            if request.method != "GET" or not request.path.startswith(suites_prefix):
+                return None
+            package_name, _, fingerprinted = request.path[
+                len(suites_prefix) :
+            ].partition("/")
+            path, has_fingerprint = check_fingerprint(fingerprinted)
+            key = f"{package_name}/{path}"
+            if key not in suites:
+                # let Dash serve it (Flask-Compress compresses it on the fly)
+                return None
+            directory = os.path.join(self.directory, SUITES_DIR)
+            return self._send(
+                directory, key, suites[key], immutable=has_fingerprint, fallback=None
+            )
+
+    def _current_suites(self):
+        """Bundled component files, skipping packages upgraded since the build."""
+        outdated = [
+            name
+            for name, version in self.manifest["packages"].items()
+            if importlib.import_module(name).__version__ != version
+        ]
+        if outdated:
+            logger.warning("Asset bundle is outdated for %s: rebuild it", outdated)
+        return {
+            key: encodings
+            for key, encodings in self.manifest["suites"].items()
+            if key.split("/", 1)[0] not in outdated
+        }
+
+    @staticmethod
+    def _send(directory, filename, encodings, immutable, fallback="identity"):
+        accepted = request.accept_encodings
+        coding = next(
+            (c for c in ("br", "gzip") if c in encodings and c in accepted), None
+        )
+        if coding is None and fallback is None:
+            return None
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        name = f"{filename}.{_EXTENSIONS[coding]}" if coding else filename
+        response = send_from_directory(directory, name, mimetype=mimetype)
+        if coding:
+            response.headers["Content-Encoding"] = coding
+        response.vary.add("Accept-Encoding")
+        if immutable:
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+def _fetch(session, url):
+    """GET url; return the response, its size on the wire and its duration."""
+    start = time.perf_counter()
+    response = session.get(url, stream=True, timeout=30)
+    raw = response.raw.read(decode_content=False)
+    elapsed = time.perf_counter() - start
+    coding = response.headers.get("Content-Encoding", "")
+    if coding == "gzip":
+        body = gzip.decompress(raw)
+    elif coding == "br":
+        body = brotli.decompress(raw)
+    else:
+        body = raw
+    return response, body, len(raw), elapsed
+
+
+SCRIPT_SRC = re.compile(r"""<script[^>]+src=["']([^"']+)["']""")
+STYLESHEET_HREF = re.compile(
+    r"""<link[^>]+rel=["']stylesheet["'][^>]*href=["']([^"']+)["']"""
+)
+# the version and modification time Dash inserts in the names of package files
+FINGERPRINT = re.compile(r"\.(v[\w-]+m[0-9a-fA-F]+)\.")
+
+# The chunks a component loads when it renders: the page does not reference
+# them, the main script of its package requests them from its own directory.
+ASYNC_CHUNKS = {
+    "dash_core_components": {
+        "Graph": ["async-graph.js", "async-plotlyjs.js"],
+        "Slider": ["async-slider.js"],
+        "RangeSlider": ["async-slider.js"],
+        "Dropdown": ["async-dropdown.js"],
+        "DatePickerSingle": ["async-datepicker.js"],
+        "DatePickerRange": ["async-datepicker.js"],
+        "Markdown": ["async-markdown.js"],
+        "Upload": ["async-upload.js"],
+    },
+    "dash_table": {"DataTable": ["async-table.js"]},
+}
+
+
+def layout_components(layout):
+    """(namespace, type) of every component of a Dash layout, as JSON."""
+    found = set()
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict) and "namespace" in node and "type" in node:
+            found.add((node["namespace"], node["type"]))
+            stack.extend(node.get("props", {}).values())
+    return found
+
+
+def async_chunks(layout):
+    """The async chunks the components of a layout load, by package.
+
+    Only the chunks marked async in the _js_dist of the installed packages
+    are kept.
+    """
+    chunks = {}
+    for namespace, component in layout_components(layout):
+        for chunk in ASYNC_CHUNKS.get(namespace, {}).get(component, []):
+            chunks.setdefault(namespace, set()).add(chunk)
+    for namespace in chunks:
+        module = importlib.import_module(namespace)
+        shipped = {
+            resource["relative_package_path"]
+            for resource in getattr(module, "_js_dist", [])
+            if resource.get("async")
+        }
+        chunks[namespace] &= shipped
+    return chunks
+
+
+def chunk_urls(script_urls, chunks):
+    """URLs of the async chunks, next to the main script of their package.
+
+    A chunk gets the fingerprint of the main script, if it has one (the
+    package files served by the app).
+    """
+    urls = []
+    for namespace, names in sorted(chunks.items()):
+        script = next((u for u in script_urls if f"/{namespace}/" in u), None)
+        if script is None:
+            continue
+        directory, _, filename = script.rpartition("/")
+        fingerprint = FINGERPRINT.search(filename)
+        for name in sorted(names):
+            if fingerprint:
+                stem, _, extension = name.partition(".")
+                name = f"{stem}.{fingerprint.group(1)}.{extension}"
+            urls.append(f"{directory}/{name}")
+    return urls
+
+
+def measure_first_load(base_url, max_connections=6):
+    """Fetch the page at base_url and the resources needed for its first paint.
+
+    Resources are fetched like a browser would with an empty cache, with up to
+    max_connections requests in parallel: first the page, then its scripts,
+    stylesheets, layout and callback dependencies, then the files the
+    stylesheets reference (imports, fonts) and the async chunks of the
+    components of the layout (see ASYNC_CHUNKS).
+    Return the number of requests, the bytes transferred (compressed, as on
+    the wire), the total time and the hosts contacted.
+    """
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    accepted = "gzip, br" if brotli is not None else "gzip"
+    session.headers["Accept-Encoding"] = accepted
+
+    start = time.perf_counter()
+    _, body, size, _ = _fetch(session, base_url)
+    html = body.decode("utf-8")
+    stats = {"requests": 1, "bytes": size, "hosts": {urlparse(base_url).netloc}}
+
+    scripts = [urljoin(base_url, url) for url in SCRIPT_SRC.findall(html)]
+    layout_url = urljoin(base_url, "_dash-layout")
+    stage = scripts + [urljoin(base_url, url) for url in STYLESHEET_HREF.findall(html)]
+    stage += [layout_url, urljoin(base_url, "_dash-dependencies")]
+    seen = set()
+    with ThreadPoolExecutor(max_workers=max_connections) as executor:
+        while stage:
+            stage = [url for url in dict.fromkeys(stage) if url not in seen]
+            seen.update(stage)
+            next_stage = []
+            for url, (response, body, size, _) in zip(
+                stage, executor.map(lambda u: _fetch(session, u), stage)
+            ):
+                stats["requests"] += 1
+                stats["bytes"] += size
+                stats["hosts"].add(urlparse(url).netloc)
+                if "css" in response.headers.get("Content-Type", ""):
+                    text = body.decode("utf-8", errors="replace")
+                    next_stage += [urljoin(url, r) for r in css_references(text)]
+                elif url == layout_url:
+                    chunks = async_chunks(json.loads(body))
+                    next_stage += chunk_urls(scripts, chunks)
+            stage = next_stage
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["hosts"] = sorted(stats["hosts"])
+    return stats
@@ -1,10 +1,13 @@
 from .components import (
     box_plot,
+    cross_filter,
     device_manufacturer_form,
     footer,
     jumbotron,
     line_charts,
     pie_charts,
     table,
+    timeline,
+    year_bounds,
     year_range,
 )
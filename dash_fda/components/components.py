@@ -5,6 +5,7 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 import dash_table
 from dash_fda.constants import INITIAL_URL, MANUFACTURERS
+from dash_fda.facets import NO_SELECTION
 from dash_fda.utils import get_meta, get_results
 
 
@@ -175,20 +176,83 @@ def line_charts():
                     ),
                 ]
             ),
+            dbc.Card(
+                [
+                    dbc.CardBody(
+                        [
+                            html.H3(
+                                "Adverse event reports received each day",
+                                className="card-title",
+                            ),
+                            dcc.Graph(id="line-chart-daily"),
+                        ]
+                    ),
+                ]
+            ),
+        ]
+    )
+
+
+def timeline():
+    return dbc.Card(
+        [
+            dbc.CardBody(
+                [
+                    html.H3(
+                        "Adverse event reports received since the beginning",
+                        className="card-title",
+                    ),
+                    html.P(
+                        "Zoom in to see the reports of each day.",
+                        className="card-text",
+                    ),
+                    dcc.Graph(id="timeline"),
+                    # width of the graph in pixels, set on the client
+                    dcc.Store(id="timeline-width"),
+                ]
+            ),
         ]
     )
 
 
+def year_bounds():
+    """First and last year selectable in the year-slider."""
+    now = datetime.datetime.now()
+    return now.year - 10, now.year
+
+
 def year_range():
     """Range slider with start year and end year."""
-    now = datetime.datetime.now()
-    year_min = now.year - 10
+    year_min, year_max = year_bounds()
     return dcc.RangeSlider(
         id="year-slider",
         min=year_min,
-        max=now.year,
-        value=[now.year - 5, now.year],
-        marks={(i): f"{i}" for i in range(year_min, now.year + 1, 1)},
+        max=year_max,
+        value=[year_max - 5, year_max],
+        marks={(i): f"{i}" for i in range(year_min, year_max + 1, 1)},
+    )
+
+
+def cross_filter():
+    """Selection shared by the charts: click a pie slice or zoom the daily chart."""
+    return html.Div(
+        [
+            dcc.Store(id="facet-selection", data=NO_SELECTION),
+            html.Span(
+                "Click a slice of a pie chart, or zoom the daily chart, to filter "
+                "every chart. ",
+                className="text-muted",
+            ),
+            html.Strong(id="cross-filter-status"),
+            dbc.Button(
+                "Clear filters",
+                id="clear-filters",
+                color="secondary",
+                size="sm",
+                className="ml-2",
+            ),
+        ],
+        className="my-2",
     )
 
 
@@ -197,12 +261,17 @@ def table():
         {"name": x, "id": x}
         for x in ["Event type", "Location", "Reporter", "Has MDR Text"]
     ]
-    return dash_table.DataTable(
-        id="table-fda",
-        columns=columns,
-        data=[],
-        fixed_rows={"headers": True},
-        # page_size=20,
-        # sort_action="native"
-        # style_table={"height": "300px", "overflowY": "auto"},
+    return html.Div(
+        [
+            dash_table.DataTable(
+                id="table-fda",
+                columns=columns,
+                data=[],
+                fixed_rows={"headers": True},
+                # page_size=20,
+                # sort_action="native"
+                # style_table={"height": "300px", "overflowY": "auto"},
+            ),
+            html.Small(id="table-fda-status", className="text-warning"),
+        ]
     )
@@ -1,8 +1,39 @@
 from .constants import (
+    ANOMALY_THRESHOLD,
+    ANOMALY_WINDOW,
     APP_NAME,
+    ASSETS_MODE,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    BUNDLE_DIR,
+    CACHE_THRESHOLD,
+    CACHE_TIMEOUT,
+    CALLBACK_DEADLINE,
     DEBUG,
+    EWMA_SPAN,
+    FALLBACK_META,
+    FACET_MAX_TERMS,
+    FACET_WORKERS,
+    FAST_JSON_ENCODER,
     INITIAL_URL,
     MANUFACTURERS,
+    PREFETCH_ENABLED,
+    PREFETCH_MAX_PENDING,
+    PREFETCH_WORKERS,
+    PROFILING,
+    PROFILING_DIR,
+    PROFILING_FORMAT,
+    PROFILING_INTERVAL,
+    PROFILING_MAX_DUMPS,
+    PROFILING_MEMORY,
+    PROFILING_THRESHOLD,
+    PROFILING_TOKEN,
+    RESPONSE_CACHE_BYTES,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_AGE,
     SECRET_KEY,
+    STALE_CACHE_BYTES,
+    TIMELINE_MAX_POINTS,
+    UPSTREAM_TIMEOUT,
     URL_PREFIX,
 )
@@ -3,7 +3,6 @@ import chart_studio
 from dotenv import load_dotenv
 from dash_fda.exceptions import ImproperlyConfigured
 
-
 DEBUG = False
 
 
@@ -62,3 +61,92 @@ if API_KEY is None:
 URL_PREFIX = f"{openFDA}{API_ENDPOINT}api_key={API_KEY}"
 
 INITIAL_URL = f"{URL_PREFIX}&count=date_of_event"
+
+# Every callback gets a latency budget (in seconds) that bounds all the openFDA
+# requests it makes. A single request never waits more than UPSTREAM_TIMEOUT.
+CALLBACK_DEADLINE = float(os.environ.get("CALLBACK_DEADLINE", 8))
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", 5))
+
+# After BREAKER_FAILURE_THRESHOLD consecutive failures the circuit breaker
+# opens, and openFDA is not called again for BREAKER_RESET_TIMEOUT seconds.
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("BREAKER_RESET_TIMEOUT", 30))
+
+# Memory (in bytes, per worker) for the last good openFDA responses kept as
+# stale fallbacks.
+STALE_CACHE_BYTES = int(os.environ.get("STALE_CACHE_BYTES", 32 * 1024 * 1024))
+
+# Shown in the footer when openFDA is down and no metadata was ever fetched.
+FALLBACK_META = {
+    "disclaimer": "openFDA is currently unavailable.",
+    "terms": "https://open.fda.gov/terms/",
+    "license": "https://open.fda.gov/license/",
+    "last_updated": "unknown",
+}
+
+# Flask-Caching settings. The threshold is the max number of cached items:
+# every slider position takes a handful of them, prefetched neighbors included.
+CACHE_THRESHOLD = int(os.environ.get("CACHE_THRESHOLD", 500))
+CACHE_TIMEOUT = int(os.environ.get("CACHE_TIMEOUT", 300))
+
+# Speculative prefetch of the year-slider positions next to the current one.
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", 2))
+PREFETCH_MAX_PENDING = int(os.environ.get("PREFETCH_MAX_PENDING", 16))
+
+# Moving statistics of the daily report series: a day is flagged as a spike
+# when it is more than ANOMALY_THRESHOLD standard deviations above the mean of
+# the ANOMALY_WINDOW days before it.
+ANOMALY_WINDOW = int(os.environ.get("ANOMALY_WINDOW", 28))
+ANOMALY_THRESHOLD = float(os.environ.get("ANOMALY_THRESHOLD", 3))
+EWMA_SPAN = int(os.environ.get("EWMA_SPAN", 14))
+
+# "cdn": Dash component libraries, stylesheets and fonts come from third-party
+# CDNs. "bundle": they are all served by the app, from the precompressed and
+# fingerprinted files built with `python -m dash_fda.bundle build`.
+ASSETS_MODE = os.environ.get("ASSETS_MODE", "cdn")
+if ASSETS_MODE not in ("cdn", "bundle"):
+    raise ImproperlyConfigured("ASSETS_MODE must be either cdn or bundle")
+BUNDLE_DIR = os.environ.get(
+    "BUNDLE_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "bundle")
+)
+
+# Encode callback responses with dash_fda.figures.FastJSONEncoder.
+FAST_JSON_ENCODER = os.environ.get("FAST_JSON_ENCODER", "1") == "1"
+
+# The timeline covers the whole openFDA history, downsampled to one point per
+# pixel of the plot width, but never more than TIMELINE_MAX_POINTS points.
+TIMELINE_MAX_POINTS = int(os.environ.get("TIMELINE_MAX_POINTS", 4000))
+
+# Cross-filtering: the facet cube counts the reports of the year range by day,
+# for each pair of the FACET_MAX_TERMS most frequent event types and device
+# classes. It takes one openFDA request per pair, FACET_WORKERS at a time.
+FACET_MAX_TERMS = int(os.environ.get("FACET_MAX_TERMS", 8))
+FACET_WORKERS = int(os.environ.get("FACET_WORKERS", 6))
+
+# Responses of the Dash callbacks kept in memory (per worker) and replayed for
+# identical requests, until the openFDA dataset is updated or for at most
+# RESPONSE_CACHE_MAX_AGE seconds.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", 64 * 1024 * 1024))
+RESPONSE_CACHE_MAX_AGE = int(os.environ.get("RESPONSE_CACHE_MAX_AGE", 3600))
+
+# Profiling of the Dash callbacks (it can also be switched on and off at
+# runtime, at /_profiling, with the X-Profiling-Token header). When it is on,
+# every callback response gets a Server-Timing header with the time spent in
+# each phase, and the callbacks slower than PROFILING_THRESHOLD seconds are
+# sampled every PROFILING_INTERVAL seconds and dumped in PROFILING_DIR.
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+PROFILING_THRESHOLD = float(os.environ.get("PROFILING_THRESHOLD", 1))
+PROFILING_INTERVAL = float(os.environ.get("PROFILING_INTERVAL", 0.005))
+PROFILING_FORMAT = os.environ.get("PROFILING_FORMAT", "speedscope")
+if PROFILING_FORMAT not in ("speedscope", "collapsed"):
+    raise ImproperlyConfigured("PROFILING_FORMAT must be speedscope or collapsed")
+PROFILING_DIR = os.environ.get(
+    "PROFILING_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "profiles")
+)
+PROFILING_MAX_DUMPS = int(os.environ.get("PROFILING_MAX_DUMPS", 50))
+# With PROFILING_MEMORY=1 the profiler, while enabled, also reports the peak of
+# the memory allocated by each callback (tracemalloc slows the app down).
+PROFILING_MEMORY = os.environ.get("PROFILING_MEMORY", "0") == "1"
@@ -1 +1,6 @@
-from .exceptions import ImproperlyConfigured
+from .exceptions import (
+    CircuitOpen,
+    DeadlineExceeded,
+    ImproperlyConfigured,
+    UpstreamUnavailable,
+)
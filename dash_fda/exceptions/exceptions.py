@@ -1,2 +1,20 @@
 class ImproperlyConfigured(Exception):
     pass
+
+
+class UpstreamUnavailable(Exception):
+    """openFDA could not be reached, or it answered with a server error."""
+
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """The latency budget of the current callback has been used up."""
+
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The circuit breaker is open, so openFDA is not even tried."""
+
+    pass
@@ -0,0 +1 @@
+from .facets import NO_SELECTION, FacetCube, has_terms, is_filtered, toggle
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+
+# Cross-filter selection: a slice of each pie chart and a date window.
+NO_SELECTION = {"event_type": None, "device_class": None, "start": None, "end": None}
+
+
+def is_filtered(selection):
+    """True if the selection restricts at least one dimension."""
+    return bool(selection) and any(v is not None for v in selection.values())
+
+
+def has_terms(selection):
+    """True if the selection picks a slice of a pie chart, not only dates.
+
+    Only such a selection needs the facet cube: a date window alone is cut
+    from the series of the app store, which count every report.
+    """
+    return bool(selection) and (
+        selection["event_type"] is not None or selection["device_class"] is not None
+    )
+
+
+def toggle(selection, dimension, value):
+    """Select value for dimension, or clear it if it is already selected."""
+    selection = dict(NO_SELECTION, **(selection or {}))
+    selection[dimension] = None if selection[dimension] == value else value
+    return selection
+
+
+class FacetCube:
+    """Counts of reports received by day × event type × device class.
+
+    counts[d, e, c] is the number of reports received on dates[d] with event
+    type event_types[e] and a device of class device_classes[c]. Every chart
+    of a cross-filter selection is a sum of this array over some axes, so it
+    is computed in memory, without calling openFDA again.
+    """
+
+    def __init__(self, dates, event_types, device_classes, counts):
+        self.dates = pd.DatetimeIndex(dates)
+        self.event_types = list(event_types)
+        self.device_classes = list(device_classes)
+        self.counts = counts
+
+    @property
+    def nbytes(self):
+        """Memory taken by the counts and the dates of the cube."""
+        return self.counts.nbytes + self.dates.nbytes
+
+    @classmethod
+    def from_results(cls, dates, event_types, device_classes, results):
+        """Build the cube from the daily counts of each pair of terms.
+
+        results[(event_type, device_class)] are the openFDA results of a
+        count=date_received query: [{"time": "YYYYMMDD", "count": n}, ...].
+        """
+        dates = pd.DatetimeIndex(dates)
+        counts = np.zeros(
+            (len(dates), len(event_types), len(device_classes)), dtype=np.int32
+        )
+        for (event_type, device_class), rows in results.items():
+            if not rows:
+                continue
+            e = event_types.index(event_type)
+            c = device_classes.index(device_class)
+            days = pd.to_datetime([r["time"] for r in rows], format="%Y%m%d")
+            positions = dates.get_indexer(days)
+            found = positions >= 0
+            values = np.array([r["count"] for r in rows])[found]
+            np.add.at(counts[:, e, c], positions[found], values)
+        return cls(dates, event_types, device_classes, counts)
+
+    def _slice(self, event_type=None, device_class=None, start=None, end=None):
+        """Dates and counts of a selection (a term missing from the cube
+        selects nothing). Every dimension keeps its axis."""
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start))
+        last = (
+            len(self.dates)
+            if end is None
+            else self.dates.searchsorted(pd.Timestamp(end), side="right")
+        )
+        counts = self.counts[first:last]
+        for axis, terms, term in (
+            (1, self.event_types, event_type),
+            (2, self.device_classes, device_class),
+        ):
+            if term is None:
+                continue
+            index = [terms.index(term)] if term in terms else []
+            counts = counts.take(index, axis=axis)
+        return self.dates[first:last], counts
+
+    def daily(self, **selection):
+        """Reports received each day for the selection, as a date-indexed Series."""
+        dates, counts = self._slice(**selection)
+        return pd.Series(counts.sum(axis=(1, 2)), index=dates, name="count")
+
+    def totals(self, dimension, **selection):
+        """Labels and counts of the terms of dimension, for the selection.
+
+        The selection of dimension itself is ignored, so that a pie chart
+        still shows all of its slices, e.g. to pick another one.
+        """
+        selection = dict(selection, **{dimension: None})
+        _, counts = self._slice(**selection)
+        if dimension == "event_type":
+            return self.event_types, counts.sum(axis=(0, 2)).tolist()
+        return self.device_classes, counts.sum(axis=(0, 1)).tolist()
@@ -0,0 +1,10 @@
+from .figures import (
+    FastJSONEncoder,
+    box,
+    data_array,
+    figure,
+    install_json_encoder,
+    layout,
+    pie,
+    scatter,
+)
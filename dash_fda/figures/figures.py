@@ -0,0 +1,176 @@
+import json
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used instead
+    orjson = None
+
+
+# Plotly figures are plain JSON: {"data": [traces], "layout": {...}}. The
+# builders below emit those dicts directly, skipping the property validation
+# of plotly.graph_objs. They accept only the properties this app uses, with
+# values that are valid by construction, and produce the same JSON as the
+# equivalent graph_objs (default template included).
+
+SCATTER_MODES = {"lines", "markers", "text"}
+HOVERINFO_FLAGS = {"x", "y", "z", "text", "name", "label", "value", "percent"}
+HOVERINFO_EXTRAS = {"all", "none", "skip"}
+
+
+def _flaglist(value, flags, extras, prop):
+    """Normalize a plotly flaglist ("label + percent" -> "label+percent")."""
+    if value in extras:
+        return value
+    parts = [part.strip() for part in value.split("+")]
+    if not parts or not set(parts) <= flags:
+        raise ValueError(f"Invalid {prop}: {value!r}")
+    return "+".join(parts)
+
+
+def data_array(values):
+    """A data array for a trace: numpy arrays and lists pass through as is.
+
+    pandas objects are unwrapped to their numpy array, and dates become ISO
+    8601 strings (like plotly does for a DatetimeIndex).
+    """
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.values
+    if isinstance(values, np.ndarray) and values.dtype.kind == "M":
+        return np.datetime_as_string(values, unit="s")
+    return values
+
+
+def _trace(trace_type, **props):
+    trace = {k: v for k, v in props.items() if v is not None}
+    trace["type"] = trace_type
+    return trace
+
+
+def scatter(
+    x,
+    y,
+    mode="lines",
+    name=None,
+    line=None,
+    marker=None,
+    fill=None,
+    fillcolor=None,
+    text=None,
+    hoverinfo=None,
+    showlegend=None,
+):
+    if mode != "none":
+        mode = _flaglist(mode, SCATTER_MODES, set(), "mode")
+    if hoverinfo is not None:
+        hoverinfo = _flaglist(hoverinfo, HOVERINFO_FLAGS, HOVERINFO_EXTRAS, "hoverinfo")
+    return _trace(
+        "scatter",
+        x=data_array(x),
+        y=data_array(y),
+        mode=mode,
+        name=name,
+        line=line,
+        marker=marker,
+        fill=fill,
+        fillcolor=fillcolor,
+        text=text,
+        hoverinfo=hoverinfo,
+        showlegend=showlegend,
+    )
+
+
+def pie(labels, values, name=None, hoverinfo=None, hole=None, pull=None):
+    if hoverinfo is not None:
+        hoverinfo = _flaglist(hoverinfo, HOVERINFO_FLAGS, HOVERINFO_EXTRAS, "hoverinfo")
+    if hole is not None and not 0 <= hole <= 1:
+        raise ValueError(f"Invalid hole: {hole!r}")
+    return _trace(
+        "pie",
+        labels=data_array(labels),
+        values=data_array(values),
+        name=name,
+        hoverinfo=hoverinfo,
+        hole=hole,
+        pull=data_array(pull),
+    )
+
+
+def box(y, name=None, boxmean=None):
+    return _trace("box", y=data_array(y), name=name, boxmean=boxmean)
+
+
+@lru_cache(maxsize=None)
+def _default_template():
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def layout(title=None, **props):
+    """A figure layout. The title is a string, other properties are as in plotly."""
+    layout = {k: v for k, v in props.items() if v is not None}
+    if title is not None:
+        layout["title"] = {"text": title}
+    layout["template"] = _default_template()
+    return layout
+
+
+def figure(data, layout):
+    return {"data": data, "layout": layout}
+
+
+def _ndarray_to_list(array):
+    if array.dtype.kind == "f" and not np.isfinite(array).all():
+        # like plotly, encode NaN and infinity as null
+        values = array.astype(object)
+        values[~np.isfinite(array)] = None
+        return values.tolist()
+    if array.dtype.kind == "M":
+        return np.datetime_as_string(array, unit="s").tolist()
+    return array.tolist()
+
+
+class FastJSONEncoder(plotly.utils.PlotlyJSONEncoder):
+    """Drop-in replacement of PlotlyJSONEncoder for callback responses.
+
+    PlotlyJSONEncoder encodes an object, and if the result may contain NaN or
+    Infinity it decodes it and encodes it again. This encoder turns NaN into
+    null while it converts numpy arrays, so it needs a single pass. When
+    orjson is installed, it serializes numpy arrays natively.
+    """
+
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            return _ndarray_to_list(obj)
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return super().default(obj)
+
+    def encode(self, o):
+        if orjson is not None and self.indent is None and not self.sort_keys:
+            try:
+                return orjson.dumps(
+                    o,
+                    default=self.default,
+                    option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+                ).decode("utf-8")
+            except orjson.JSONEncodeError:
+                pass
+        encoded = json.JSONEncoder.encode(self, o)
+        if "NaN" in encoded or "Infinity" in encoded:
+            # a float NaN outside of a numpy array (or a false positive,
+            # e.g. in a title): let PlotlyJSONEncoder deal with it
+            return super().encode(o)
+        return encoded
+
+
+def install_json_encoder():
+    """Make Dash encode callback responses with FastJSONEncoder.
+
+    Dash looks up plotly.utils.PlotlyJSONEncoder each time it encodes a
+    response, so replacing it there is enough.
+    """
+    plotly.utils.PlotlyJSONEncoder = FastJSONEncoder
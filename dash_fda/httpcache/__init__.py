@@ -0,0 +1 @@
+from .httpcache import ResponseCache, request_key
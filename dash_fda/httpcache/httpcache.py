@@ -0,0 +1,229 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, g, request, session
+from dash_fda.resilience import is_stale
+
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(body, version):
+    """Hash of a callback request: callback outputs, inputs, state and trigger.
+
+    The JSON is canonicalized, so the same request sent by different sessions
+    (or reloads) gets the same key. The dataset version is part of the key.
+    """
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{version}\0{canonical}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Replay the responses of Dash callbacks for repeated identical requests.
+
+    Responses are kept (with a gzip variant) in an LRU bounded by max_bytes,
+    keyed by the hash of the callback request and the dataset version, and
+    identical requests are answered with the stored bytes, without running
+    the callback. Every cached response has an ETag: a request that sends it
+    back in If-None-Match gets a 304. When the dataset version changes, all
+    the stored responses are dropped, and a response older than max_age
+    seconds is never replayed.
+
+    `version` is called in a background thread, at most once every
+    version_ttl seconds, so that requests never wait for it. It returns None
+    while the version is unknown (e.g. openFDA is down): nothing is cached
+    until it is known.
+
+    Responses are not cached when they are not a 200, when they were built
+    from stale openFDA results, when the callback changed the Flask session,
+    or when the callback output is in `exclude` (callbacks with side effects).
+    """
+
+    def __init__(
+        self,
+        max_bytes,
+        version,
+        version_ttl=300,
+        max_age=3600,
+        exclude=(),
+        enabled=True,
+        clock=time.monotonic,
+    ):
+        self.max_bytes = max_bytes
+        self.version = version
+        self.version_ttl = version_ttl
+        self.max_age = max_age
+        self.exclude = set(exclude)
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._version_checked_at = None
+        self._refreshing = False
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "bypassed": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    def init_app(self, app):
+        """Register the request hooks on the Flask server of the Dash app."""
+        server = app.server
+        path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+        @server.before_request
+        def replay_callback_response():
+            if not self.enabled or request.method != "POST" or request.path != path:
+                return None
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict) or body.get("output") in self.exclude:
+                return None
+            version = self._current_version()
+            if version is None:
+                with self._lock:
+                    self._counters["bypassed"] += 1
+                return None
+            g.response_cache_key = key = request_key(body, version)
+            g.response_cache_etag = etag = f"{version}-{key[:24]}"
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._expired(entry):
+                    self._remove(key)
+                    self._counters["expired"] += 1
+                    entry = None
+                if entry is None:
+                    self._counters["misses"] += 1
+                    return None
+                self._entries.move_to_end(key)
+                if request.if_none_match.contains(etag):
+                    self._counters["not_modified"] += 1
+                    status = 304
+                else:
+                    self._counters["hits"] += 1
+                    status = 200
+            g.response_cache_hit = True
+            return self._replay(entry, etag, status)
+
+        @server.after_request
+        def store_callback_response(response):
+            key = g.get("response_cache_key")
+            if key is None or g.get("response_cache_hit"):
+                return response
+            if response.status_code != 200 or is_stale() or session.modified:
+                with self._lock:
+                    self._counters["bypassed"] += 1
+                return response
+            data = response.get_data()
+            entry = {
+                "identity": data,
+                "gzip": gzip.compress(data, compresslevel=6),
+                "mimetype": response.mimetype,
+                "stored_at": self._clock(),
+            }
+            self._store(key, entry)
+            # send the stored bytes, so that a miss and a hit look the same
+            self._encode(response, entry)
+            self._validators(response, g.response_cache_etag)
+            return response
+
+    def _current_version(self):
+        """The last known dataset version, refreshed in the background."""
+        with self._lock:
+            checked_at = self._version_checked_at
+            refresh = not self._refreshing and (
+                checked_at is None or self._clock() - checked_at >= self.version_ttl
+            )
+            if refresh:
+                self._refreshing = True
+            version = self._version
+        if refresh:
+            threading.Thread(
+                target=self.refresh_version, name="response-cache-version", daemon=True
+            ).start()
+        return version
+
+    def refresh_version(self):
+        """Check the dataset version, and drop the responses if it changed."""
+        try:
+            version = self.version()
+        except Exception:  # keep the version known so far
+            logger.exception("Cannot check the dataset version")
+            version = self._version
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            self._version_checked_at = self._clock()
+            self._refreshing = False
+        return version
+
+    def _expired(self, entry):
+        return self._clock() - entry["stored_at"] > self.max_age
+
+    def _remove(self, key):
+        self._bytes -= self._size(self._entries.pop(key))
+
+    @staticmethod
+    def _size(entry):
+        return len(entry["identity"]) + len(entry["gzip"])
+
+    def _store(self, key, entry):
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self._counters["evictions"] += 1
+
+    def _replay(self, entry, etag, status):
+        response = Response(status=status, mimetype=entry["mimetype"])
+        if status == 200:
+            self._encode(response, entry)
+        self._validators(response, etag)
+        return response
+
+    @staticmethod
+    def _encode(response, entry):
+        """Fill response with the stored bytes of entry, gzipped if accepted."""
+        if "gzip" in request.accept_encodings:
+            response.set_data(entry["gzip"])
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response.set_data(entry["identity"])
+        response.vary.add("Accept-Encoding")
+
+    @staticmethod
+    def _validators(response, etag):
+        response.set_etag(etag)
+        # the client may keep the response, but it must revalidate it
+        response.headers["Cache-Control"] = "no-cache"
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            lookups += self._counters["not_modified"]
+            hits = self._counters["hits"] + self._counters["not_modified"]
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                version=self._version,
+                hit_rate=hits / lookups if lookups else 0.0,
+            )
@@ -0,0 +1 @@
+from .prefetch import Prefetcher, neighbors
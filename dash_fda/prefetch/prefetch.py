@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+
+logger = logging.getLogger(__name__)
+
+
+def neighbors(year_range, bounds):
+    """Slider positions one step away from year_range: ±1 year on each handle."""
+    year_min, year_max = bounds
+    begin, end = year_range
+    candidates = [
+        (begin - 1, end),
+        (begin + 1, end),
+        (begin, end - 1),
+        (begin, end + 1),
+    ]
+    return [(b, e) for b, e in candidates if year_min <= b <= e <= year_max]
+
+
+class Prefetcher:
+    """Warm the cache with the slider positions a session is likely to visit next.
+
+    Every time a session moves the year slider, the positions one step away
+    from the new one are queued, and a few background threads call `warm` on
+    them. Prefetching has a lower priority than user callbacks: a worker does
+    not start a task while a callback decorated with `foreground` is running.
+    Tasks queued for a slider position the session has already left are
+    cancelled (cancel-on-stale), unless the current position of a session
+    needs them too, and the queue never holds more than
+    max_pending tasks (the oldest ones are dropped).
+    """
+
+    def __init__(
+        self,
+        warm,
+        bounds,
+        max_workers=2,
+        max_pending=16,
+        max_sessions=1024,
+        ttl=300,
+        enabled=True,
+        clock=time.monotonic,
+    ):
+        self.warm = warm
+        self.bounds = bounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.enabled = enabled
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._pending = set()
+        self._generations = OrderedDict()
+        self._warmed = OrderedDict()
+        self._active = 0
+        self._workers = []
+        self._stats = {
+            "observed": 0,
+            "hits": 0,
+            "prefetched": 0,
+            "cancelled": 0,
+            "dropped": 0,
+            "failed": 0,
+        }
+
+    def observe(self, session_id, year_range, manufacturer, device):
+        """Record a slider position and queue its neighbors for prefetching."""
+        if not self.enabled or session_id is None:
+            return
+        key = (year_range[0], year_range[1], manufacturer, device)
+        with self._cond:
+            self._stats["observed"] += 1
+            if self._is_fresh(key):
+                self._stats["hits"] += 1
+            self._warmed.pop(key, None)
+
+            # a new generation makes the tasks queued for this session stale
+            generation = self._generations.pop(session_id, 0) + 1
+            self._generations[session_id] = generation
+            while len(self._generations) > self.max_sessions:
+                self._generations.popitem(last=False)
+
+            for b, e in neighbors(year_range, self.bounds()):
+                task_key = (b, e, manufacturer, device)
+                if self._is_fresh(task_key):
+                    continue
+                if task_key in self._pending:
+                    self._adopt(session_id, generation, task_key)
+                    continue
+                if len(self._queue) >= self.max_pending:
+                    _, _, dropped_key = self._queue.popleft()
+                    self._pending.discard(dropped_key)
+                    self._stats["dropped"] += 1
+                self._queue.append((session_id, generation, task_key))
+                self._pending.add(task_key)
+            self._start_workers()
+            self._cond.notify_all()
+
+    def foreground(self, func):
+        """Decorate a user callback: prefetching waits while it is running."""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self._cond:
+                self._active += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+        return wrapper
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._queue)
+        # hit_rate: share of slider moves that found their data prefetched.
+        # useful_rate: share of prefetched positions that were visited later.
+        stats["hit_rate"] = _ratio(stats["hits"], stats["observed"])
+        stats["useful_rate"] = _ratio(stats["hits"], stats["prefetched"])
+        return stats
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work, name="prefetch-worker", daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _is_fresh(self, key):
+        warmed_at = self._warmed.get(key)
+        return warmed_at is not None and self._clock() - warmed_at < self.ttl
+
+    def _is_stale(self, session_id, generation):
+        return self._generations.get(session_id) != generation
+
+    def _adopt(self, session_id, generation, key):
+        """Take over a queued task for key if it would be cancelled, because the
+        position that queued it was left (by this session or another one)."""
+        for i, (owner, owner_generation, queued_key) in enumerate(self._queue):
+            if queued_key == key:
+                if self._is_stale(owner, owner_generation):
+                    self._queue[i] = (session_id, generation, key)
+                return
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                while self._queue and self._is_stale(*self._queue[0][:2]):
+                    _, _, key = self._queue.popleft()
+                    self._pending.discard(key)
+                    self._stats["cancelled"] += 1
+                if self._queue and self._active == 0:
+                    return self._queue.popleft()
+                self._cond.wait()
+
+    def _work(self):
+        while True:
+            session_id, generation, key = self._next_task()
+            try:
+                self.warm(key)
+            except Exception:
+                logger.exception("Prefetch of %s failed", key)
+                with self._cond:
+                    self._pending.discard(key)
+                    self._stats["failed"] += 1
+                continue
+            with self._cond:
+                self._pending.discard(key)
+                self._warmed[key] = self._clock()
+                while len(self._warmed) > self.max_pending * 4:
+                    self._warmed.popitem(last=False)
+                self._stats["prefetched"] += 1
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
@@ -0,0 +1,10 @@
+from .profiling import (
+    PHASES,
+    Profiler,
+    collapsed,
+    phase,
+    profiler,
+    reset_peak,
+    speedscope,
+    timed,
+)
@@ -0,0 +1,515 @@
+import hmac
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import nullcontext
+from functools import wraps
+from flask import g, jsonify, request
+from dash_fda.constants import (
+    PROFILING,
+    PROFILING_DIR,
+    PROFILING_FORMAT,
+    PROFILING_INTERVAL,
+    PROFILING_MAX_DUMPS,
+    PROFILING_MEMORY,
+    PROFILING_THRESHOLD,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Phases of a callback request, in the order they usually happen. Time spent in
+# the callback outside of the other phases counts as "build_figure", and the
+# time between the end of the callback and the response as "serialize".
+PHASES = ("fetch", "decode", "aggregate", "build_figure", "serialize")
+
+# Callback inputs can be large (the app store): their dump is truncated.
+MAX_INPUT_LENGTH = 2000
+
+# Profiles waiting to be written; more slow callbacks than that are not dumped.
+MAX_PENDING_DUMPS = 16
+
+_local = threading.local()
+_NOOP = nullcontext()
+
+
+def reset_peak():
+    """Start measuring a new peak of the memory traced by tracemalloc.
+
+    Return the traced memory the peak must be compared with. Python 3.8 has no
+    tracemalloc.reset_peak, but clearing the traces resets the peak too.
+    """
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()
+    return tracemalloc.get_traced_memory()[0]
+
+
+class _Phases:
+    """Exclusive time spent in each phase by the current request.
+
+    Phases nest: while a nested phase runs, its parent is paused, so that every
+    second is counted in exactly one phase.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.started_at = clock()
+        self.totals = defaultdict(float)
+        self.stack = []
+        self.callback = None
+        self.callback_ended_at = None
+        self.peak_bytes = None
+
+    def enter(self, name):
+        now = self.clock()
+        if self.stack:
+            parent, since = self.stack[-1]
+            self.totals[parent] += now - since
+        self.stack.append([name, now])
+
+    def exit(self):
+        now = self.clock()
+        name, since = self.stack.pop()
+        self.totals[name] += now - since
+        if self.stack:
+            self.stack[-1][1] = now
+
+
+class _Phase:
+    __slots__ = ("phases", "name")
+
+    def __init__(self, phases, name):
+        self.phases = phases
+        self.name = name
+
+    def __enter__(self):
+        self.phases.enter(self.name)
+
+    def __exit__(self, *exc_info):
+        self.phases.exit()
+
+
+def _frame_label(code):
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def _stack(frame):
+    """Labels of the frames of a stack, from the outermost to the innermost."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+def _dump_input(value):
+    try:
+        text = json.dumps(value, default=str)
+    except (TypeError, ValueError):
+        text = repr(value)
+    if len(text) > MAX_INPUT_LENGTH:
+        text = f"{text[:MAX_INPUT_LENGTH]}... ({len(text)} characters)"
+    return text
+
+
+def collapsed(samples):
+    """Samples in the collapsed-stack format of flamegraph.pl (one line per stack)."""
+    counts = defaultdict(int)
+    for _, stack in samples:
+        counts[";".join(stack)] += 1
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def speedscope(samples, name, started_at, ended_at):
+    """Samples as a sampled profile in the speedscope file format."""
+    frames = []
+    index = {}
+    stacks = []
+    weights = []
+    previous = started_at
+    for sampled_at, stack in samples:
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+        stacks.append([index[label] for label in stack])
+        weights.append(sampled_at - previous)
+        previous = sampled_at
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "dash_fda.profiling",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": ended_at - started_at,
+                "samples": stacks,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+class Profiler:
+    """Time the phases of the Dash callbacks, and sample the slow ones.
+
+    While the profiler is disabled, `phase`, `timed` and `profile` add a single
+    attribute lookup to the code they wrap. While it is enabled:
+
+    - every callback request is split in PHASES, reported in a Server-Timing
+      header and aggregated by callback in `stats`;
+    - a background thread samples the stack of every running callback, and the
+      samples of the callbacks slower than `threshold` seconds are written to
+      `directory` (collapsed stacks or speedscope), next to a JSON file with
+      the callback inputs, its duration and its phases. Another background
+      thread writes them, so that the request is not slowed down;
+    - with `memory`, tracemalloc measures the peak of the memory allocated by
+      each callback. The peak is process-wide, so a callback is not measured
+      while another one is (concurrent callbacks would inflate its peak).
+      tracemalloc runs only while the profiler is enabled.
+    """
+
+    def __init__(
+        self,
+        directory,
+        threshold=1.0,
+        interval=0.005,
+        fmt="speedscope",
+        max_dumps=50,
+        enabled=False,
+        memory=False,
+        clock=time.perf_counter,
+    ):
+        self.directory = directory
+        self.threshold = threshold
+        self.interval = interval
+        self.fmt = fmt
+        self.max_dumps = max_dumps
+        self._enabled = False
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._targets = {}
+        self._sampler = None
+        self._dumps = queue.Queue(maxsize=MAX_PENDING_DUMPS)
+        self._writer = None
+        self._stats = {}
+        self._memory = False
+        self._memory_lock = threading.Lock()
+        self._tracing = False
+        self.enabled = enabled
+        self.memory = memory
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = bool(value)
+        self._update_tracing()
+
+    @property
+    def memory(self):
+        return self._memory
+
+    @memory.setter
+    def memory(self, value):
+        self._memory = bool(value)
+        self._update_tracing()
+
+    def _update_tracing(self):
+        """Trace the allocations only while the memory of callbacks is measured."""
+        # wait for the callback being measured, if any
+        with self._memory_lock:
+            measuring = self._enabled and self._memory
+            if measuring and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            elif not measuring and self._tracing:
+                # stop tracing only if the profiler started it
+                tracemalloc.stop()
+                self._tracing = False
+
+    def phase(self, name):
+        """Context manager that counts the time of its block in phase `name`."""
+        phases = getattr(_local, "phases", None) if self._enabled else None
+        if phases is None:
+            return _NOOP
+        return _Phase(phases, name)
+
+    def timed(self, name):
+        """Decorator that counts the time of each call in phase `name`."""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def profile(self, func):
+        """Decorate a Dash callback: time its phases and sample it if it is slow."""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            phases = getattr(_local, "phases", None) if self._enabled else None
+            if phases is None:
+                return func(*args, **kwargs)
+            phases.callback = func.__name__
+            measured = self._memory and self._memory_lock.acquire(blocking=False)
+            if measured:
+                baseline = reset_peak()
+            samples = self._start_sampling()
+            started_at = self._clock()
+            try:
+                with _Phase(phases, "build_figure"):
+                    return func(*args, **kwargs)
+            finally:
+                ended_at = phases.callback_ended_at = self._clock()
+                self._stop_sampling()
+                if measured:
+                    phases.peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+                    self._memory_lock.release()
+                if ended_at - started_at > self.threshold and samples:
+                    self._queue_dump(
+                        func.__name__, samples, started_at, ended_at, args, phases
+                    )
+
+        return wrapper
+
+    def _start_sampling(self):
+        samples = []
+        with self._cond:
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample, name="profiler", daemon=True
+                )
+                self._sampler.start()
+            self._targets[threading.get_ident()] = samples
+            self._cond.notify()
+        return samples
+
+    def _stop_sampling(self):
+        with self._cond:
+            self._targets.pop(threading.get_ident(), None)
+
+    def _sample(self):
+        while True:
+            with self._cond:
+                while not self._targets:
+                    self._cond.wait()
+                targets = dict(self._targets)
+            frames = sys._current_frames()
+            now = self._clock()
+            for thread_id, samples in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples.append((now, _stack(frame)))
+            del frames
+            time.sleep(self.interval)
+
+    def _queue_dump(self, name, samples, started_at, ended_at, args, phases):
+        """Hand a profile over to the writer thread."""
+        with self._cond:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_dumps, name="profiler-writer", daemon=True
+                )
+                self._writer.start()
+        totals = dict(phases.totals)
+        try:
+            self._dumps.put_nowait(
+                (name, samples, started_at, ended_at, args, totals, phases.peak_bytes)
+            )
+        except queue.Full:
+            logger.warning("Too many profiles to write, %s not dumped", name)
+
+    def _write_dumps(self):
+        while True:
+            dump = self._dumps.get()
+            try:
+                self._dump(*dump)
+            except Exception:  # the writer must survive a bad dump
+                logger.exception("Cannot dump the profile of %s", dump[0])
+            finally:
+                self._dumps.task_done()
+
+    def flush(self):
+        """Wait until the profiles of the slow callbacks are written."""
+        self._dumps.join()
+
+    def _dump(self, name, samples, started_at, ended_at, args, totals, peak_bytes):
+        duration = ended_at - started_at
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = f"{stamp}-{name}-{int(duration * 1000)}ms"
+        if self.fmt == "speedscope":
+            filename = f"{base}.speedscope.json"
+            content = json.dumps(speedscope(samples, name, started_at, ended_at))
+        else:
+            filename = f"{base}.collapsed"
+            content = collapsed(samples)
+        meta = {
+            "callback": name,
+            "duration": duration,
+            "threshold": self.threshold,
+            "samples": len(samples),
+            "profile": filename,
+            "inputs": [_dump_input(arg) for arg in args],
+            "phases": totals,
+            "peak_bytes": peak_bytes,
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, filename), "w") as f:
+                f.write(content)
+            with open(os.path.join(self.directory, f"{base}.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            self._prune()
+        except OSError:
+            logger.exception("Cannot write the profile of %s", name)
+            return
+        logger.warning("%s took %.2fs, profile in %s", name, duration, filename)
+        with self._cond:
+            self._callback_stats(name)["dumps"] += 1
+
+    def _prune(self):
+        """Keep only the max_dumps most recent profiles."""
+        metas = sorted(
+            name for name in os.listdir(self.directory) if name.endswith("ms.json")
+        )
+        for meta in metas[: max(0, len(metas) - self.max_dumps)]:
+            base = meta[: -len(".json")]
+            for name in os.listdir(self.directory):
+                if name.startswith(base):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except FileNotFoundError:
+                        # pruned by another worker sharing the directory
+                        pass
+
+    def _callback_stats(self, name):
+        if name not in self._stats:
+            self._stats[name] = {
+                "calls": 0,
+                "slow": 0,
+                "dumps": 0,
+                "max": 0.0,
+                "seconds": dict.fromkeys(PHASES + ("other",), 0.0),
+                "memory_calls": 0,
+                "peak_bytes_max": 0,
+                "peak_bytes_total": 0,
+            }
+        return self._stats[name]
+
+    def _record(self, phases, ended_at):
+        """Aggregate the phases of a finished request. Return its breakdown."""
+        breakdown = dict(phases.totals)
+        breakdown["serialize"] = ended_at - phases.callback_ended_at
+        total = ended_at - phases.started_at
+        breakdown["other"] = max(0.0, total - sum(breakdown.values()))
+        with self._cond:
+            stats = self._callback_stats(phases.callback)
+            stats["calls"] += 1
+            stats["slow"] += total > self.threshold
+            stats["max"] = max(stats["max"], total)
+            for name, seconds in breakdown.items():
+                stats["seconds"][name] = stats["seconds"].get(name, 0.0) + seconds
+            if phases.peak_bytes is not None:
+                stats["memory_calls"] += 1
+                stats["peak_bytes_max"] = max(
+                    stats["peak_bytes_max"], phases.peak_bytes
+                )
+                stats["peak_bytes_total"] += phases.peak_bytes
+        return breakdown, total
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "memory": self.memory,
+                "threshold": self.threshold,
+                "format": self.fmt,
+                "callbacks": json.loads(json.dumps(self._stats)),
+            }
+
+    def init_app(self, app, token=None):
+        """Time the callback requests of the Dash app, and add the admin route.
+
+        The admin route (GET for the stats, POST to switch the profiler or its
+        memory mode on or off, and to change the threshold) exists only if a
+        token is given.
+        """
+        server = app.server
+        prefix = app.config.routes_pathname_prefix
+        path = f"{prefix}_dash-update-component"
+
+        @server.before_request
+        def start_phases():
+            if self._enabled and request.path == path:
+                _local.phases = g.profiler_phases = _Phases(self._clock)
+
+        @server.after_request
+        def record_phases(response):
+            phases = g.pop("profiler_phases", None)
+            _local.phases = None
+            if phases is None or phases.callback is None:
+                return response
+            breakdown, total = self._record(phases, self._clock())
+            timings = [
+                f"{name};dur={seconds * 1000:.1f}"
+                for name, seconds in breakdown.items()
+            ]
+            timings.append(f"total;dur={total * 1000:.1f}")
+            if phases.peak_bytes is not None:
+                megabytes = phases.peak_bytes / 2 ** 20
+                timings.append(f'memory;desc="peak {megabytes:.1f} MiB"')
+            response.headers["Server-Timing"] = ", ".join(timings)
+            return response
+
+        if token is None:
+            return
+
+        @server.route(f"{prefix}_profiling", methods=["GET", "POST"])
+        def profiling():
+            sent = request.headers.get("X-Profiling-Token", "")
+            if not hmac.compare_digest(sent, token):
+                return "Forbidden", 403
+            if request.method == "POST":
+                settings = request.get_json(silent=True) or {}
+                if "enabled" in settings:
+                    self.enabled = bool(settings["enabled"])
+                if "memory" in settings:
+                    self.memory = settings["memory"]
+                if "threshold" in settings:
+                    self.threshold = float(settings["threshold"])
+            return jsonify(self.stats())
+
+
+profiler = Profiler(
+    directory=PROFILING_DIR,
+    threshold=PROFILING_THRESHOLD,
+    interval=PROFILING_INTERVAL,
+    fmt=PROFILING_FORMAT,
+    max_dumps=PROFILING_MAX_DUMPS,
+    enabled=PROFILING,
+    memory=PROFILING_MEMORY,
+)
+phase = profiler.phase
+timed = profiler.timed
@@ -0,0 +1,15 @@
+from .resilience import (
+    CircuitBreaker,
+    LastGood,
+    SingleFlight,
+    breaker,
+    deadline,
+    fetch,
+    is_stale,
+    last_good,
+    map_within_deadline,
+    mark_stale,
+    remaining,
+    stale_scope,
+    with_deadline,
+)
@@ -0,0 +1,310 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+import requests
+from dash_fda.constants import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT,
+    CALLBACK_DEADLINE,
+    STALE_CACHE_BYTES,
+    UPSTREAM_TIMEOUT,
+)
+from dash_fda.exceptions import CircuitOpen, DeadlineExceeded, UpstreamUnavailable
+from dash_fda.profiling import phase, timed
+
+
+# Dash runs each callback in the thread that handles its HTTP request, so the
+# deadline and the "stale" flag of the current callback are thread-local.
+_local = threading.local()
+
+
+class CircuitBreaker:
+    """Stop calling openFDA after repeated failures, and fail fast instead.
+
+    closed: requests go through; consecutive failures are counted.
+    open: requests fail immediately with CircuitOpen until reset_timeout has
+    elapsed since the breaker opened.
+    half-open: a single trial request goes through. If it succeeds the breaker
+    closes, otherwise it opens again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN:
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpen if the request should not be attempted."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                raise CircuitOpen("openFDA circuit breaker is open")
+            if state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpen("openFDA circuit breaker is half-open")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == self.HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+    def release(self):
+        """Forget a call that neither succeeded nor failed (e.g. cut short by
+        the deadline of the callback): a half-open breaker allows a new trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+
+
+@contextmanager
+def deadline(budget=CALLBACK_DEADLINE):
+    """Bound every upstream request made in this block to `budget` seconds."""
+    previous = getattr(_local, "expires_at", None)
+    expires_at = time.monotonic() + budget
+    if previous is not None:
+        # a nested deadline can only shrink the budget, never extend it
+        expires_at = min(expires_at, previous)
+    _local.expires_at = expires_at
+    _local.stale = False
+    try:
+        yield
+    finally:
+        _local.expires_at = previous
+
+
+def with_deadline(budget=CALLBACK_DEADLINE):
+    """Decorate a Dash callback so that its upstream requests share a budget."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with deadline(budget):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def remaining():
+    """Seconds left in the current deadline, or None if there is no deadline."""
+    expires_at = getattr(_local, "expires_at", None)
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+def map_within_deadline(func, items, max_workers):
+    """Call func on each item in a pool of threads, within the current deadline.
+
+    Each thread gets what is left of the deadline of the caller, and the caller
+    is flagged as stale if any of the calls served a stale result.
+    """
+    left = remaining()
+    expires_at = time.monotonic() + (CALLBACK_DEADLINE if left is None else left)
+
+    def call(item):
+        with deadline(expires_at - time.monotonic()):
+            return func(item), is_stale()
+
+    # the requests run in other threads: the caller is waiting for openFDA
+    with phase("fetch"), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        outcomes = list(executor.map(call, items))
+    if any(stale for _, stale in outcomes):
+        mark_stale()
+    return [result for result, _ in outcomes]
+
+
+@timed("fetch")
+def fetch(url):
+    """GET an openFDA URL within the current deadline.
+
+    Client errors (e.g. 404 when a search matches nothing) are valid answers
+    and are returned to the caller. Timeouts, connection errors and server
+    errors count as failures for the circuit breaker and are raised as
+    UpstreamUnavailable (or one of its subclasses). A timeout shortened by the
+    deadline of the callback does not count: openFDA may be slow but healthy.
+    """
+    timeout = UPSTREAM_TIMEOUT
+    left = remaining()
+    if left is not None:
+        if left <= 0:
+            raise DeadlineExceeded("no time left to call openFDA")
+        timeout = min(timeout, left)
+
+    breaker.before_call()
+    try:
+        response = requests.get(url, timeout=timeout)
+    except requests.Timeout as e:
+        if timeout < UPSTREAM_TIMEOUT:
+            breaker.release()
+        else:
+            breaker.record_failure()
+        raise DeadlineExceeded(str(e)) from e
+    except requests.RequestException as e:
+        breaker.record_failure()
+        raise UpstreamUnavailable(str(e)) from e
+
+    if response.status_code >= 500 or response.status_code == 429:
+        breaker.record_failure()
+        raise UpstreamUnavailable(f"openFDA answered {response.status_code}")
+    breaker.record_success()
+    return response
+
+
+class LastGood:
+    """LRU of the last good value fetched for each key, bounded by max_bytes.
+
+    The caller gives the size of each value, so keep compact values (e.g. the
+    text of an openFDA response rather than its decoded results). A value
+    larger than max_bytes is not kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return self._bytes
+
+    def remember(self, key, value, nbytes):
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return
+            self._data[key] = (value, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+
+    def _discard(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def recall(self, key, default):
+        """Return the last good value for key (or default) after a failure.
+
+        The callback is flagged as stale even when there is no last good value:
+        the default is not a good value either, and must not be cached.
+        """
+        mark_stale()
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+last_good = LastGood(STALE_CACHE_BYTES)
+
+
+class SingleFlight:
+    """Run a single call at a time for each key.
+
+    The callers that ask for a key while its call is running wait for it and
+    share its result (or its exception) instead of calling again: a burst of
+    callbacks that need the same openFDA data sends a single batch of requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event()}
+        if not leader:
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = func()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+def mark_stale():
+    _local.stale = True
+
+
+def is_stale():
+    """True if the current callback served at least one stale (or missing) result."""
+    return getattr(_local, "stale", False)
+
+
+@contextmanager
+def stale_scope():
+    """Track the staleness of the results fetched in this block on their own.
+
+    In the block, is_stale() is True only if a result fetched in the block is
+    stale. The flag of the enclosing block is restored on exit (and set if the
+    block served a stale result). Use it around each loader that reports its
+    own staleness, so that a fresh result is not flagged because an earlier
+    loader of the same callback served a stale one.
+    """
+    previous = is_stale()
+    _local.stale = False
+    try:
+        yield
+    finally:
+        _local.stale = previous or is_stale()
@@ -0,0 +1 @@
+from .timeline import downsample, zoom_range
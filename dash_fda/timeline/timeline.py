@@ -0,0 +1,42 @@
+import pandas as pd
+from dash_fda.analytics import lttb
+
+
+def zoom_range(relayout_data):
+    """The x-axis range set by a relayoutData event of a plotly graph.
+
+    Return (start, end) timestamps after a zoom or a pan, (None, None) when the
+    x-axis is reset (autorange), and None if the event does not change the
+    x-axis (e.g. a zoom on the y-axis only, or the initial autosize).
+    """
+    if not relayout_data:
+        return None
+    if relayout_data.get("xaxis.autorange"):
+        return None, None
+    if "xaxis.range" in relayout_data:
+        start, end = relayout_data["xaxis.range"]
+    elif "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        start = relayout_data["xaxis.range[0]"]
+        end = relayout_data["xaxis.range[1]"]
+    else:
+        return None
+    return pd.Timestamp(start), pd.Timestamp(end)
+
+
+def downsample(series, points, x_range=(None, None)):
+    """The points of a date-indexed series to plot, at most `points` of them.
+
+    With an x_range, only the window (padded with half its width on each side,
+    so that a short pan does not reveal an empty plot) is downsampled, with
+    twice as many points: the visible part gets `points` of them. A window
+    with fewer points than that is returned at full resolution.
+    """
+    start, end = x_range
+    if start is not None and end is not None:
+        pad = (end - start) / 2
+        series = series.loc[start - pad : end + pad]
+        points *= 2
+    if len(series) <= points:
+        return series
+    indices = lttb(series.index.asi8, series.values, points)
+    return series.iloc[indices]
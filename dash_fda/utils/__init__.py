@@ -1,5 +1,6 @@
 from .utils import (
     create_intermediate_df,
+    create_daily,
     create_days,
     create_months,
     create_months_box,
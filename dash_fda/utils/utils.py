@@ -1,24 +1,56 @@
-import requests
+import sys
 import pandas as pd
 from flask import json
+from dash_fda.constants import FALLBACK_META
+from dash_fda.exceptions import UpstreamUnavailable
+from dash_fda.profiling import phase, timed
+from dash_fda.resilience import fetch, last_good
 
 
-def get_results(url):
-    response = requests.get(url)
+def get_results(url, remember=True):
+    """Return the results of an openFDA query.
+
+    If openFDA is unavailable (or the deadline of the current callback is
+    exceeded) return the last good results for the same URL, or no results,
+    and flag the callback as stale. With remember=False the results are not
+    kept as the last good ones (the caller keeps what it builds from them).
+    The last good response is kept as text, which takes several times less
+    memory than the decoded results, and decoded again only when needed.
+    """
+    try:
+        response = fetch(url)
+    except UpstreamUnavailable:
+        text = last_good.recall(("results", url), default=None)
+        if text is None:
+            return []
+        with phase("decode"):
+            return json.loads(text)["results"]
     if response.ok:
-        d = json.loads(response.text)
+        text = response.text
+        with phase("decode"):
+            d = json.loads(text)
         results = d["results"]
+        if remember:
+            last_good.remember(("results", url), text, len(text))
     else:
         results = []
     return results
 
 
 def get_meta(url):
-    response = requests.get(url)
-    d = json.loads(response.text)
-    return d["meta"]
-
-
+    try:
+        response = fetch(url)
+        with phase("decode"):
+            d = json.loads(response.text)
+        meta = d["meta"]
+    except (UpstreamUnavailable, KeyError, ValueError):
+        return last_good.recall(("meta", url), default=FALLBACK_META)
+    # the metadata is a small dict: its shallow size is close enough
+    last_good.remember(("meta", url), meta, sys.getsizeof(meta))
+    return meta
+
+
+@timed("decode")
 def create_intermediate_df(url):
     results = get_results(url)
     df = pd.DataFrame(results)
@@ -26,11 +58,13 @@ def create_intermediate_df(url):
     return df
 
 
+@timed("decode")
 def unjsonify(state, field):
     """Deserialize a JSON-formatted value, identified by its field in state."""
     return pd.DataFrame(json.loads(state[field]))
 
 
+@timed("aggregate")
 def create_years(df):
     """Convert a DataFrame in a grouped DataFrame, by year.
 
@@ -50,6 +84,7 @@ def create_years(df):
     return dframe
 
 
+@timed("aggregate")
 def create_months(df):
     """Convert a DataFrame in a grouped DataFrame, by month.
 
@@ -97,6 +132,7 @@ def create_months(df):
     return dframe
 
 
+@timed("aggregate")
 def create_days(df):
     # In order to group by week, year, etc later on, we need to create a
     # datetime variable now and set it as an index (because DataFrame.resample
@@ -136,6 +172,20 @@ def create_days(df):
     return dframe
 
 
+@timed("aggregate")
+def create_daily(df):
+    """Convert a DataFrame in a date-indexed DataFrame, with one row per day.
+
+    Days without reports are not in the openFDA results: here they are filled
+    with zeros, so that moving statistics see an evenly spaced series.
+    """
+    df["date"] = pd.to_datetime(df["time"])
+    df.set_index(df["date"], inplace=True)
+    df.drop(["time", "date"], axis=1, inplace=True)
+    return df.resample("D").sum()
+
+
+@timed("aggregate")
 def create_months_box(df):
     # In order to group by week, year, etc later on, we need to create a
     # datetime variable now and set it as an index (because DataFrame.resample
@@ -5,4 +5,79 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, project_root)
 import dash_fda
 from dash_fda.constants import URL_PREFIX
-from dash_fda.app import app, update_table
+from dash_fda.app import (
+    app,
+    cache,
+    fetch_facet_cube,
+    fetch_store_data,
+    received_counts,
+    report_counts,
+    state_analytics,
+    term_counts,
+    update_box_plot_by_month,
+    update_line_chart_by_day,
+    update_line_chart_by_month,
+    update_line_chart_by_year,
+    update_line_chart_daily,
+    update_table,
+    warm_cache,
+)
+from dash_fda.exceptions import (
+    CircuitOpen,
+    DeadlineExceeded,
+    ImproperlyConfigured,
+    UpstreamUnavailable,
+)
+from dash_fda.resilience import (
+    CircuitBreaker,
+    LastGood,
+    SingleFlight,
+    is_stale,
+    deadline,
+    fetch,
+    last_good,
+    map_within_deadline,
+    remaining,
+    stale_scope,
+)
+from dash_fda.utils import get_results
+from dash_fda.prefetch import Prefetcher, neighbors
+from dash_fda.analytics import (
+    anomalies,
+    ewma,
+    lttb,
+    rolling_mean,
+    rolling_statistics,
+    rolling_std,
+)
+from dash_fda.timeline import downsample, zoom_range
+from dash_fda.facets import NO_SELECTION, FacetCube, has_terms, is_filtered, toggle
+from dash_fda.bundle import Bundle, async_chunks, chunk_urls, css_references
+from dash_fda.bundle.bundle import _StylesheetVendor, _write, brotli
+from dash_fda import figures as dff
+from dash_fda.httpcache import ResponseCache
+from dash_fda.profiling import Profiler, collapsed
+from benchmarks import openfda
+from benchmarks.memory import CALLBACKS, MIB, RANGE_SIZES, Harness, load_budgets
+
+
+class FakeClock:
+    """A clock that only moves when the test sets `now`."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def post_callback(client, value, headers=None):
+    """POST the request Dash sends for a callback from in.children to
+    out.children (the layout of the test apps)."""
+    body = {
+        "output": "out.children",
+        "outputs": {"id": "out", "property": "children"},
+        "inputs": [{"id": "in", "property": "children", "value": value}],
+        "changedPropIds": ["in.children"],
+    }
+    return client.post("/_dash-update-component", json=body, headers=headers or {})
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import pandas as pd
+from ddt import ddt, data
+from .context import (
+    anomalies,
+    ewma,
+    lttb,
+    rolling_mean,
+    rolling_statistics,
+    rolling_std,
+)
+
+
+@ddt
+class TestAnalytics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.series = pd.Series(
+            rng.poisson(200, 5000).astype(float),
+            index=pd.date_range("2000-01-01", periods=5000, freq="D"),
+        )
+
+    @data(2, 7, 28, 365)
+    def test_rolling_mean_and_std_match_pandas(self, window):
+        rolling = self.series.rolling(window)
+        np.testing.assert_allclose(
+            rolling_mean(self.series.values, window), rolling.mean().values
+        )
+        np.testing.assert_allclose(
+            rolling_std(self.series.values, window), rolling.std().values
+        )
+
+    @data(1, 3, 14, 1000)
+    def test_ewma_matches_pandas(self, span):
+        expected = self.series.ewm(span=span, adjust=False).mean().values
+        np.testing.assert_allclose(ewma(self.series.values, span), expected)
+
+    def test_window_longer_than_the_series_is_all_nan(self):
+        self.assertTrue(np.isnan(rolling_mean([1, 2, 3], 5)).all())
+
+    def test_a_spike_is_flagged(self):
+        values = self.series.values.copy()
+        values[3000] = 1000
+        mask = anomalies(values, window=28, threshold=5)
+        self.assertListEqual(list(np.flatnonzero(mask)), [3000])
+
+    def test_rolling_statistics_keeps_the_date_index(self):
+        df = rolling_statistics(self.series, window=28, span=14, threshold=3)
+        self.assertTrue(df.index.equals(self.series.index))
+        self.assertTrue((df["upper"].dropna() >= df["lower"].dropna()).all())
+
+    @data(3, 100, 1000)
+    def test_lttb_keeps_the_endpoints_and_the_peaks(self, threshold):
+        values = self.series.values.copy()
+        values[1234] = 5000
+        x = self.series.index.asi8
+        indices = lttb(x, values, threshold)
+        self.assertEqual(len(indices), threshold)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], len(values) - 1)
+        self.assertTrue((np.diff(indices) > 0).all())
+        if threshold > 3:
+            self.assertIn(1234, indices)
+
+    def test_lttb_does_not_downsample_short_series(self):
+        indices = lttb([0, 1, 2], [5, 6, 7], 10)
+        self.assertListEqual(list(indices), [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
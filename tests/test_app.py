@@ -1,9 +1,34 @@
 import requests
+import threading
+import time
 import unittest
+from unittest import mock
 import dash_html_components as html
 from ddt import ddt, data
 from flask import json
-from .context import app, update_table, URL_PREFIX
+from .context import (
+    NO_SELECTION,
+    CircuitBreaker,
+    app,
+    cache,
+    deadline,
+    fetch_facet_cube,
+    fetch_store_data,
+    last_good,
+    openfda,
+    received_counts,
+    report_counts,
+    state_analytics,
+    term_counts,
+    update_box_plot_by_month,
+    update_line_chart_by_day,
+    update_line_chart_by_month,
+    update_line_chart_by_year,
+    update_line_chart_daily,
+    update_table,
+    warm_cache,
+    URL_PREFIX,
+)
 
 
 @ddt
@@ -38,5 +63,168 @@ class TestExample(unittest.TestCase):
         self.assertListEqual(d["response"]["props"]["rows"], [])
 
 
+class StubTestCase(unittest.TestCase):
+    """Run the app against the openFDA stub, with empty caches."""
+
+    def setUp(self):
+        cache.clear()
+        last_good.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(last_good.clear)
+        # a failure must not open the breaker of the app for the next tests
+        patch = mock.patch(
+            "dash_fda.resilience.resilience.breaker",
+            CircuitBreaker(failure_threshold=1000, reset_timeout=0),
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+
+def slow(get, delay=0.05):
+    def get_slowly(url, timeout=None):
+        time.sleep(delay)
+        return get(url, timeout)
+
+    return get_slowly
+
+
+class TestFacetCubeFetch(StubTestCase):
+    def get(self, *failing):
+        """Patch openFDA with the stub, failing the URLs that contain failing."""
+
+        def get(url, timeout=None):
+            if failing and all(part in url for part in failing):
+                raise requests.ConnectionError("openFDA is down")
+            return openfda.get(url, timeout)
+
+        return mock.patch(
+            "dash_fda.resilience.resilience.requests.get", side_effect=get
+        )
+
+    def test_cube_is_fresh(self):
+        with self.get(), deadline():
+            self.assertFalse(fetch_facet_cube(2020, 2020)["stale"])
+
+    def test_cube_with_a_failed_pair_is_stale_and_not_cached(self):
+        with self.get("event_type:", "Death"), deadline():
+            self.assertTrue(fetch_facet_cube(2020, 2020)["stale"])
+        with self.get() as get, deadline():
+            self.assertFalse(fetch_facet_cube(2020, 2020)["stale"])
+        self.assertTrue(get.called)
+
+    def test_concurrent_callbacks_share_a_single_build(self):
+        def build():
+            with deadline():
+                facets.append(fetch_facet_cube(2020, 2020))
+
+        facets = []
+        with self.get("event_type:", "Death") as get:
+            # slow down openFDA, so that the builds overlap
+            get.side_effect = slow(get.side_effect)
+            threads = [threading.Thread(target=build) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(facets), 3)
+        self.assertTrue(all(f["stale"] for f in facets))
+        # the 2 term counts and the 5 x 6 pairs of the stub, once
+        self.assertEqual(get.call_count, 2 + 5 * 6)
+
+    def test_failed_pair_serves_the_last_good_cube(self):
+        with self.get(), deadline():
+            fresh = fetch_facet_cube(2020, 2020)["cube"]
+        cache.clear()
+        with self.get("event_type:", "Death"), deadline():
+            facets = fetch_facet_cube(2020, 2020)
+        self.assertTrue(facets["stale"])
+        self.assertTrue((facets["cube"].counts == fresh.counts).all())
+
+
+class TestOpenFdaDown(StubTestCase):
+    """openFDA is down, and there are no last good results to fall back on."""
+
+    CHARTS = [
+        update_line_chart_by_year,
+        update_line_chart_by_month,
+        update_box_plot_by_month,
+        update_line_chart_by_day,
+        update_line_chart_daily,
+    ]
+
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch(
+            "dash_fda.resilience.resilience.requests.get",
+            side_effect=requests.ConnectionError("openFDA is down"),
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_store_fed_charts_are_empty_and_stale(self):
+        with deadline():
+            state = fetch_store_data(2020, 2020)
+        # the store comes back from the browser as JSON
+        state = json.loads(json.dumps(state))
+        for chart in self.CHARTS:
+            # skip the Dash wrapper, which parses the request
+            with self.subTest(chart.__name__), app.server.test_request_context():
+                figure = chart.__wrapped__(state, None)
+                self.assertListEqual(figure["data"], [])
+                self.assertIn("stale data", figure["layout"]["title"]["text"])
+
+    def test_cache_warming_does_not_fail(self):
+        warm_cache((2020, 2020, "COVIDIEN", "ligasure"))
+
+
+class TestDateWindow(StubTestCase):
+    SELECTION = dict(NO_SELECTION, start="2020-03-01", end="2020-03-31")
+
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch(
+            "dash_fda.resilience.resilience.requests.get", side_effect=openfda.get
+        )
+        self.get = patch.start()
+        self.addCleanup(patch.stop)
+        with deadline():
+            self.state = fetch_store_data(2019, 2020)
+        self.get.reset_mock()
+
+    def tearDown(self):
+        # a date window alone never needs the facet cube
+        urls = [call.args[0] for call in self.get.call_args_list]
+        self.assertFalse([url for url in urls if "+AND+event_type:" in url])
+
+    def test_received_counts_are_cut_from_the_store(self):
+        with deadline():
+            everything = received_counts(self.state, NO_SELECTION)
+            window = received_counts(self.state, self.SELECTION)
+        march = everything[everything["time"].str.startswith("202003")]
+        self.assertEqual(len(window), 31)
+        self.assertEqual(window["count"].sum(), march["count"].sum())
+
+    def test_report_counts_keep_the_date_of_event(self):
+        with deadline():
+            df = report_counts(self.state, self.SELECTION)
+        self.assertListEqual(sorted(df.columns), ["A", "B", "time"])
+        self.assertEqual(len(df), 31)
+
+    def test_analytics_are_cut_to_the_window(self):
+        with deadline():
+            stats = state_analytics(self.state, self.SELECTION)["stats"]
+        self.assertEqual(str(stats.index[0].date()), "2020-03-01")
+        self.assertEqual(str(stats.index[-1].date()), "2020-03-31")
+
+    def test_term_counts_of_the_window_come_from_openfda(self):
+        with deadline():
+            counts = term_counts(
+                [2019, 2020], self.SELECTION, "event_type", "event_type"
+            )
+        self.assertTrue(counts["labels"])
+        url = self.get.call_args.args[0]
+        self.assertIn("date_received:[2020-03-01+TO+2020-03-31]", url)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,266 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import dash
+import dash_html_components as html
+import dash_renderer
+from ddt import ddt, data, unpack
+from flask import Flask
+from .context import (
+    Bundle,
+    ImproperlyConfigured,
+    _StylesheetVendor,
+    _write,
+    async_chunks,
+    brotli,
+    chunk_urls,
+    css_references,
+)
+
+
+FONT = b"wOF2" + bytes(range(256)) * 4
+
+STYLESHEETS = {
+    "https://cdn.example.com/css/theme.css": (
+        "text/css",
+        b'@import "base.css";\n'
+        b"body { background: url(data:image/png;base64,AAAA); }\n"
+        b"@font-face { src: url('../fonts/lato.woff2') format('woff2'); }\n",
+    ),
+    "https://cdn.example.com/css/base.css": ("text/css", b"a { color: red; }\n" * 50),
+    "https://cdn.example.com/fonts/lato.woff2": ("font/woff2", FONT),
+}
+
+
+class FakeResponse:
+    def __init__(self, content_type, content):
+        self.headers = {"Content-Type": content_type}
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return FakeResponse(*self.responses[url])
+
+
+@ddt
+class TestStylesheetVendor(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.session = FakeSession(STYLESHEETS)
+        self.vendor = _StylesheetVendor(self.directory, self.session)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name)) as f:
+            return f.read()
+
+    def test_css_references_skip_data_uris(self):
+        text = STYLESHEETS["https://cdn.example.com/css/theme.css"][1].decode()
+        self.assertListEqual(css_references(text), ["base.css", "../fonts/lato.woff2"])
+
+    def test_references_point_to_the_vendored_files(self):
+        name = self.vendor.vendor("https://cdn.example.com/css/theme.css")
+        css = self.read(name)
+        base = self.vendor.names["https://cdn.example.com/css/base.css"]
+        font = self.vendor.names["https://cdn.example.com/fonts/lato.woff2"]
+        self.assertIn(f'@import "{base}";', css)
+        self.assertIn(f"url('{font}')", css)
+        self.assertIn("url(data:image/png;base64,AAAA)", css)
+        self.assertListEqual(css_references(css), [base, font])
+
+    def test_each_file_is_downloaded_once(self):
+        self.vendor.vendor("https://cdn.example.com/css/theme.css")
+        self.vendor.vendor("https://cdn.example.com/css/base.css")
+        self.assertEqual(len(self.session.urls), 3)
+
+    def test_compressible_files_have_compressed_variants(self):
+        self.vendor.vendor("https://cdn.example.com/css/theme.css")
+        base = self.vendor.names["https://cdn.example.com/css/base.css"]
+        self.assertIn("gzip", self.vendor.files[base])
+        self.assertTrue(os.path.isfile(os.path.join(self.directory, f"{base}.gz")))
+
+    def test_fingerprinted_name(self):
+        name = _StylesheetVendor._fingerprinted_name(
+            "https://cdn.example.com/css/bootstrap.min.css?v=4", b"a", ".css"
+        )
+        self.assertRegex(name, r"^bootstrap\.min\.[0-9a-f]{12}\.css$")
+
+    def test_fingerprinted_name_changes_with_the_content(self):
+        url = "https://cdn.example.com/css/theme.css"
+        self.assertNotEqual(
+            _StylesheetVendor._fingerprinted_name(url, b"a", ".css"),
+            _StylesheetVendor._fingerprinted_name(url, b"b", ".css"),
+        )
+
+    @data(
+        ("https://fonts.example.com/s/lato", ".woff2", r"^lato\.[0-9a-f]{12}\.woff2$"),
+        ("https://fonts.example.com/", "", r"^index\.[0-9a-f]{12}$"),
+    )
+    @unpack
+    def test_fingerprinted_name_without_extension(self, url, extension, pattern):
+        name = _StylesheetVendor._fingerprinted_name(url, b"a", extension)
+        self.assertRegex(name, pattern)
+
+
+SUITE_PATH = "dash_renderer/dash_renderer.min.js"
+SUITE_URL = "/_dash-component-suites/dash_renderer/dash_renderer.min.js"
+FINGERPRINTED_SUITE_URL = (
+    "/_dash-component-suites/dash_renderer/dash_renderer.v1_8_1m1600000000.min.js"
+)
+STYLESHEET = "https://cdn.example.com/css/base.css"
+
+
+@ddt
+class TestBundle(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        content = STYLESHEETS[STYLESHEET][1]
+        self.static_name = "base.0123456789ab.css"
+        self.manifest = {
+            "stylesheets": {STYLESHEET: self.static_name},
+            "static": {
+                self.static_name: _write(
+                    os.path.join(self.directory, "static"), self.static_name, content
+                )
+            },
+            "suites": {
+                SUITE_PATH: _write(
+                    os.path.join(self.directory, "_dash-component-suites"),
+                    SUITE_PATH,
+                    b"/* bundled */" + b" " * 1000,
+                )
+            },
+            "packages": {"dash_renderer": dash_renderer.__version__},
+        }
+
+    def client(self):
+        with open(os.path.join(self.directory, "manifest.json"), "w") as f:
+            json.dump(self.manifest, f)
+        bundle = Bundle(self.directory)
+        app = dash.Dash(__name__, server=Flask(__name__), serve_locally=True)
+        app.layout = html.Div()
+        bundle.init_app(app)
+        return bundle, app.server.test_client()
+
+    def test_missing_bundle_is_an_error(self):
+        with self.assertRaises(ImproperlyConfigured) as cm:
+            Bundle(self.directory)
+        self.assertIn("python -m dash_fda.bundle build", str(cm.exception))
+
+    def test_stylesheets_are_replaced_by_their_bundled_copy(self):
+        bundle, _ = self.client()
+        self.assertListEqual(
+            bundle.stylesheets([STYLESHEET]), [f"/_bundle/{self.static_name}"]
+        )
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_is_preferred(self):
+        _, client = self.client()
+        response = client.get(
+            f"/_bundle/{self.static_name}", headers={"Accept-Encoding": "gzip, br"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "br")
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+
+    def test_gzip_without_brotli(self):
+        _, client = self.client()
+        response = client.get(
+            f"/_bundle/{self.static_name}", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    def test_identity_without_accepted_encodings(self):
+        _, client = self.client()
+        response = client.get(
+            f"/_bundle/{self.static_name}", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.data, STYLESHEETS[STYLESHEET][1])
+
+    def test_unknown_file_is_not_found(self):
+        _, client = self.client()
+        self.assertEqual(client.get("/_bundle/unknown.css").status_code, 404)
+
+    @data((SUITE_URL, False), (FINGERPRINTED_SUITE_URL, True))
+    @unpack
+    def test_suites_are_served_precompressed(self, url, immutable):
+        _, client = self.client()
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(
+            "immutable" in response.headers.get("Cache-Control", ""), immutable
+        )
+
+    def test_suites_fall_back_to_dash_without_accepted_encodings(self):
+        _, client = self.client()
+        response = client.get(SUITE_URL, headers={"Accept-Encoding": "identity"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"/* bundled */", response.data)
+
+    def test_outdated_packages_are_skipped(self):
+        self.manifest["packages"]["dash_renderer"] = "0.0.0"
+        with self.assertLogs("dash_fda.bundle.bundle", level="WARNING"):
+            bundle, client = self.client()
+        self.assertDictEqual(bundle._current_suites(), {})
+        response = client.get(SUITE_URL, headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn(b"/* bundled */", response.data)
+
+
+@ddt
+class TestAsyncChunks(unittest.TestCase):
+    LAYOUT = {
+        "namespace": "dash_html_components",
+        "type": "Div",
+        "props": {
+            "style": {"display": "flex"},
+            "children": [
+                {"namespace": "dash_core_components", "type": "Graph", "props": {}},
+                {"namespace": "dash_core_components", "type": "Store", "props": {}},
+                {"namespace": "dash_table", "type": "DataTable", "props": {}},
+            ],
+        },
+    }
+
+    def test_chunks_of_the_components_of_the_layout(self):
+        self.assertDictEqual(
+            async_chunks(self.LAYOUT),
+            {
+                "dash_core_components": {"async-graph.js", "async-plotlyjs.js"},
+                "dash_table": {"async-table.js"},
+            },
+        )
+
+    @data(
+        (
+            "https://unpkg.com/dash-table@4.10.1/dash_table/bundle.js",
+            "https://unpkg.com/dash-table@4.10.1/dash_table/async-table.js",
+        ),
+        (
+            "http://localhost/_dash-component-suites/dash_table/bundle.v4_10_1m1600.js",
+            "http://localhost/_dash-component-suites/dash_table/"
+            "async-table.v4_10_1m1600.js",
+        ),
+    )
+    @unpack
+    def test_chunks_are_next_to_the_main_script(self, script, chunk):
+        scripts = ["http://localhost/_dash-component-suites/react.min.js", script]
+        self.assertListEqual(
+            chunk_urls(scripts, {"dash_table": {"async-table.js"}}), [chunk]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+import pandas as pd
+from ddt import ddt, data, unpack
+from .context import NO_SELECTION, FacetCube, has_terms, is_filtered, toggle
+
+
+@ddt
+class TestFacetCube(unittest.TestCase):
+    def setUp(self):
+        results = {
+            ("Injury", "2"): [
+                {"time": "20200101", "count": 3},
+                {"time": "20200103", "count": 4},
+            ],
+            ("Injury", "3"): [{"time": "20200102", "count": 1}],
+            ("Malfunction", "2"): [
+                {"time": "20200101", "count": 10},
+                # outside of the date range of the cube
+                {"time": "20210101", "count": 99},
+            ],
+            ("Malfunction", "3"): [],
+        }
+        self.cube = FacetCube.from_results(
+            dates=pd.date_range("2020-01-01", "2020-01-03", freq="D"),
+            event_types=["Malfunction", "Injury"],
+            device_classes=["2", "3"],
+            results=results,
+        )
+
+    def test_counts(self):
+        self.assertEqual(self.cube.counts.shape, (3, 2, 2))
+        self.assertEqual(self.cube.counts.sum(), 18)
+
+    @data(
+        ({}, [13, 1, 4]),
+        ({"event_type": "Injury"}, [3, 1, 4]),
+        ({"event_type": "Injury", "device_class": "3"}, [0, 1, 0]),
+        ({"start": "2020-01-02", "end": "2020-01-02"}, [1]),
+        ({"event_type": "Death"}, [0, 0, 0]),
+    )
+    @unpack
+    def test_daily(self, selection, expected):
+        daily = self.cube.daily(**selection)
+        self.assertListEqual(daily.tolist(), expected)
+        self.assertIsInstance(daily.index, pd.DatetimeIndex)
+
+    def test_totals_ignore_the_selection_of_their_own_dimension(self):
+        labels, values = self.cube.totals(
+            "event_type", event_type="Injury", device_class="2"
+        )
+        self.assertListEqual(labels, ["Malfunction", "Injury"])
+        self.assertListEqual(values, [10, 7])
+
+    def test_totals_of_a_date_window(self):
+        labels, values = self.cube.totals("device_class", start="2020-01-02")
+        self.assertListEqual(labels, ["2", "3"])
+        self.assertListEqual(values, [4, 1])
+
+
+class TestSelection(unittest.TestCase):
+    def test_toggle_selects_then_clears(self):
+        selection = toggle(NO_SELECTION, "event_type", "Injury")
+        self.assertEqual(selection["event_type"], "Injury")
+        self.assertTrue(is_filtered(selection))
+        selection = toggle(selection, "event_type", "Injury")
+        self.assertFalse(is_filtered(selection))
+
+    def test_no_selection_is_not_filtered(self):
+        self.assertFalse(is_filtered(NO_SELECTION))
+        self.assertFalse(is_filtered(None))
+
+    def test_date_window_has_no_terms(self):
+        selection = dict(NO_SELECTION, start="2020-03-01", end="2020-03-31")
+        self.assertTrue(is_filtered(selection))
+        self.assertFalse(has_terms(selection))
+        self.assertTrue(has_terms(toggle(selection, "device_class", "2")))
+
+
+if __name__ == "__main__":
+    unittest.main()
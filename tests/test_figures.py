@@ -0,0 +1,108 @@
+import json
+import unittest
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+from _plotly_utils.utils import PlotlyJSONEncoder
+from ddt import ddt, data, unpack
+from .context import dff
+
+
+DAYS = pd.date_range("2020-01-01", periods=4, freq="D")
+COUNTS = np.array([3.0, np.nan, 5.0, 2.0])
+
+
+def encode(obj, cls):
+    return json.loads(json.dumps(obj, cls=cls))
+
+
+@ddt
+class TestFastJSONEncoder(unittest.TestCase):
+    def test_nan_and_infinity_in_arrays_become_null(self):
+        array = np.array([1.5, np.nan, np.inf, -np.inf])
+        self.assertListEqual(
+            encode({"y": array}, dff.FastJSONEncoder)["y"], [1.5, None, None, None]
+        )
+
+    def test_nan_outside_arrays_is_encoded_like_plotly(self):
+        obj = {"y": [1.0, float("nan")], "name": "NaN"}
+        self.assertDictEqual(
+            encode(obj, dff.FastJSONEncoder), encode(obj, PlotlyJSONEncoder)
+        )
+
+    def test_datetime64_arrays_become_iso_strings(self):
+        self.assertListEqual(
+            encode({"x": DAYS.values[:2]}, dff.FastJSONEncoder)["x"],
+            ["2020-01-01T00:00:00", "2020-01-02T00:00:00"],
+        )
+
+    @data(np.int64(3), np.float32(0.5), np.bool_(True))
+    def test_numpy_scalars(self, value):
+        self.assertEqual(encode([value], dff.FastJSONEncoder), [value.item()])
+
+
+@ddt
+class TestBuilders(unittest.TestCase):
+    def assertSameFigure(self, traces, expected_traces, **layout):
+        actual = dff.figure(data=traces, layout=dff.layout(**layout))
+        expected = go.Figure(data=expected_traces, layout=go.Layout(**layout))
+        self.assertDictEqual(
+            encode(actual, dff.FastJSONEncoder), encode(expected, PlotlyJSONEncoder)
+        )
+
+    @data(
+        dict(mode="lines", name="Reports"),
+        dict(mode="lines + markers", hoverinfo="x+y", showlegend=False),
+        dict(mode="markers", marker=dict(symbol="x", size=12), text=["a"] * 4),
+        dict(mode="none", fill="tozeroy", fillcolor="rgba(0,0,0,0.1)"),
+    )
+    def test_scatter(self, props):
+        self.assertSameFigure(
+            [dff.scatter(x=DAYS, y=COUNTS, **props)],
+            [go.Scatter(x=DAYS, y=COUNTS, **props)],
+            title="Daily reports",
+        )
+
+    def test_scatter_with_series(self):
+        series = pd.Series(COUNTS, index=DAYS)
+        self.assertSameFigure(
+            [dff.scatter(x=series.index, y=series)],
+            [go.Scatter(x=series.index, y=series, mode="lines")],
+        )
+
+    def test_pie(self):
+        props = dict(
+            labels=["Injury", "Death"],
+            values=[10, 2],
+            hoverinfo="label + percent",
+            hole=0.3,
+            pull=[0.1, 0],
+        )
+        self.assertSameFigure([dff.pie(**props)], [go.Pie(**props)])
+
+    def test_box(self):
+        self.assertSameFigure(
+            [dff.box(y=COUNTS, name="January", boxmean="sd")],
+            [go.Box(y=COUNTS, name="January", boxmean="sd")],
+            hovermode="closest",
+            xaxis=dict(title=dict(text="Month")),
+        )
+
+    @data(
+        (dff.scatter, dict(x=[1], y=[1], mode="lines+bars")),
+        (dff.scatter, dict(x=[1], y=[1], hoverinfo="x+nothing")),
+        (dff.pie, dict(labels=["a"], values=[1], hoverinfo="label+")),
+        (dff.pie, dict(labels=["a"], values=[1], hole=1.5)),
+    )
+    @unpack
+    def test_invalid_properties_are_rejected(self, builder, props):
+        with self.assertRaises(ValueError):
+            builder(**props)
+
+    @data("all", "none", "skip")
+    def test_hoverinfo_extras_are_accepted(self, hoverinfo):
+        self.assertEqual(dff.pie([], [], hoverinfo=hoverinfo)["hoverinfo"], hoverinfo)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import threading
+import unittest
+import dash
+import dash_html_components as html
+from dash.dependencies import Input, Output
+from flask import Flask
+from .context import (
+    FakeClock,
+    ResponseCache,
+    deadline,
+    last_good,
+    post_callback,
+)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.version = "2020-09-18"
+        self.clock = FakeClock()
+        self.calls = []
+        app = dash.Dash(__name__, server=Flask(__name__))
+        app.layout = html.Div([html.Div(id="in"), html.Div(id="out")])
+
+        @app.callback(Output("out", "children"), [Input("in", "children")])
+        def echo(value):
+            with deadline(1):
+                self.calls.append(value)
+                if value == "stale":
+                    last_good.remember("stale", "x", 1)
+                    last_good.recall("stale", default=None)
+                return value * 100
+
+        self.cache = ResponseCache(
+            max_bytes=4096,
+            version=lambda: self.version,
+            version_ttl=60,
+            max_age=600,
+            clock=self.clock,
+        )
+        self.cache.refresh_version()
+        self.cache.init_app(app)
+        self.client = app.server.test_client()
+
+    def post(self, value, headers=None):
+        return post_callback(self.client, value, headers)
+
+    def test_identical_request_is_replayed(self):
+        first = self.post("a")
+        second = self.post("a")
+        self.assertEqual(self.calls, ["a"])
+        self.assertEqual(first.get_json(), second.get_json())
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_matching_etag_gets_a_304(self):
+        etag = self.post("a").headers["ETag"]
+        response = self.post("a", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_new_dataset_version_drops_the_responses(self):
+        etag = self.post("a").headers["ETag"]
+        self.version = "2020-09-25"
+        self.cache.refresh_version()
+        response = self.post("a", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(self.calls, ["a", "a"])
+
+    def test_old_response_is_not_replayed(self):
+        self.post("a")
+        self.clock.now = 601
+        self.post("a")
+        self.assertEqual(self.calls, ["a", "a"])
+        self.assertEqual(self.cache.stats()["expired"], 1)
+
+    def test_nothing_is_cached_while_the_version_is_unknown(self):
+        self.version = None
+        self.cache.refresh_version()
+        self.post("a")
+        self.post("a")
+        self.assertEqual(self.calls, ["a", "a"])
+        self.assertEqual(self.cache.stats()["bypassed"], 2)
+
+    def test_requests_do_not_wait_for_the_version(self):
+        answered, checked = threading.Event(), threading.Event()
+
+        def version():
+            answered.wait(5)
+            checked.set()
+            return "2020-09-25"
+
+        self.cache.version = version
+        self.clock.now = 60
+        self.post("a")
+        # the request was answered while the version was being checked
+        self.assertFalse(checked.is_set())
+        answered.set()
+        self.assertTrue(checked.wait(5))
+
+    def test_stale_response_is_not_cached(self):
+        self.post("stale")
+        self.post("stale")
+        self.assertEqual(self.calls, ["stale", "stale"])
+        self.assertEqual(self.cache.stats()["bypassed"], 2)
+
+    def test_least_recently_used_response_is_evicted(self):
+        for value in "abcdefghij":
+            self.post(value * 10)
+        stats = self.cache.stats()
+        self.assertLessEqual(stats["bytes"], 4096)
+        self.assertGreater(stats["evictions"], 0)
+        self.post("a" * 10)
+        self.assertEqual(self.calls.count("a" * 10), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
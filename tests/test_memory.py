@@ -0,0 +1,32 @@
+import unittest
+from ddt import ddt, data
+from .context import CALLBACKS, MIB, RANGE_SIZES, Harness, load_budgets
+
+
+@ddt
+class TestMemoryBudgets(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.budgets = load_budgets()
+        cls.harness = Harness().__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.harness.__exit__(None, None, None)
+
+    @data(*RANGE_SIZES)
+    def test_callbacks_stay_within_their_budget(self, years):
+        for name in CALLBACKS:
+            with self.subTest(callback=name):
+                budget = self.budgets[name][str(years)]
+                peak, retained = self.harness.measure(name, years)
+                self.assertLessEqual(peak, budget["peak"] * MIB)
+                self.assertLessEqual(retained, budget["retained"] * MIB)
+
+    def test_retained_memory_is_bounded_by_the_peak(self):
+        peak, retained = self.harness.measure("update_line_chart_daily", 1)
+        self.assertLessEqual(retained, peak)
+
+
+if __name__ == "__main__":
+    unittest.main()
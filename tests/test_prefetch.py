@@ -0,0 +1,76 @@
+import threading
+import unittest
+from .context import Prefetcher, neighbors
+
+
+class TestPrefetcher(unittest.TestCase):
+    def test_neighbors_stay_within_the_slider_bounds(self):
+        self.assertListEqual(
+            neighbors((2010, 2012), (2010, 2020)),
+            [(2011, 2012), (2010, 2011), (2010, 2013)],
+        )
+        self.assertListEqual(
+            neighbors((2015, 2015), (2015, 2015)),
+            [],
+        )
+
+    def test_prefetched_position_counts_as_a_hit(self):
+        warmed = threading.Event()
+        keys = []
+
+        def warm(key):
+            keys.append(key)
+            if len(keys) == 4:
+                warmed.set()
+
+        prefetcher = Prefetcher(warm, bounds=lambda: (2000, 2020), max_workers=1)
+        prefetcher.observe("s1", [2010, 2015], "COVIDIEN", "x-ray")
+        self.assertTrue(warmed.wait(timeout=5))
+        prefetcher.observe("s1", [2011, 2015], "COVIDIEN", "x-ray")
+        stats = prefetcher.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_tasks_of_a_previous_position_are_cancelled(self):
+        prefetcher = Prefetcher(lambda key: None, bounds=lambda: (2000, 2020))
+        # keep the workers idle, as if a user callback were running
+        busy = threading.Event()
+        callback = prefetcher.foreground(lambda: busy.wait(timeout=5))
+        thread = threading.Thread(target=callback)
+        thread.start()
+        prefetcher.observe("s1", [2010, 2015], "COVIDIEN", "x-ray")
+        prefetcher.observe("s1", [2012, 2018], "COVIDIEN", "x-ray")
+        busy.set()
+        thread.join()
+        for _ in range(50):
+            if prefetcher.stats()["prefetched"] == 4:
+                break
+            threading.Event().wait(0.1)
+        stats = prefetcher.stats()
+        self.assertEqual(stats["cancelled"], 4)
+        self.assertEqual(stats["prefetched"], 4)
+
+    def test_neighbor_queued_by_a_previous_position_is_not_cancelled(self):
+        keys = []
+        prefetcher = Prefetcher(keys.append, bounds=lambda: (2000, 2020))
+        busy = threading.Event()
+        callback = prefetcher.foreground(lambda: busy.wait(timeout=5))
+        thread = threading.Thread(target=callback)
+        thread.start()
+        prefetcher.observe("s1", [2010, 2015], "COVIDIEN", "x-ray")
+        prefetcher.observe("s1", [2011, 2015], "COVIDIEN", "x-ray")
+        # (2010, 2016) is a neighbor of the first position and of this one
+        prefetcher.observe("s1", [2011, 2016], "COVIDIEN", "x-ray")
+        busy.set()
+        thread.join()
+        for _ in range(50):
+            if prefetcher.stats()["prefetched"] == 4:
+                break
+            threading.Event().wait(0.1)
+        self.assertCountEqual(
+            [(b, e) for b, e, _, _ in keys], neighbors((2011, 2016), (2000, 2020))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
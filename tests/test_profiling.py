@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+import dash
+import dash_html_components as html
+from dash.dependencies import Input, Output
+from ddt import ddt, data
+from flask import Flask
+from .context import Profiler, collapsed, post_callback
+
+
+@ddt
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = profiler = Profiler(
+            self.directory, threshold=0.05, interval=0.001, enabled=True
+        )
+        app = dash.Dash(__name__, server=Flask(__name__))
+        app.layout = html.Div([html.Div(id="in"), html.Div(id="out")])
+
+        @profiler.timed("fetch")
+        def fetch(seconds):
+            time.sleep(seconds)
+
+        @app.callback(Output("out", "children"), [Input("in", "children")])
+        @profiler.profile
+        def slow_callback(seconds):
+            with profiler.phase("aggregate"):
+                fetch(seconds)
+            return "done"
+
+        profiler.init_app(app, token="secret")
+        self.client = app.server.test_client()
+
+    def tearDown(self):
+        self.profiler.memory = False
+        shutil.rmtree(self.directory)
+
+    def post(self, seconds):
+        return post_callback(self.client, seconds)
+
+    def server_timing(self, response):
+        timings = {}
+        for timing in response.headers["Server-Timing"].split(", "):
+            name, duration = timing.split(";dur=")
+            timings[name] = float(duration)
+        return timings
+
+    def test_phases_are_exclusive(self):
+        timings = self.server_timing(self.post(0.02))
+        self.assertGreaterEqual(timings["fetch"], 20)
+        self.assertLess(timings["aggregate"], 10)
+        parts = sum(v for k, v in timings.items() if k != "total")
+        self.assertAlmostEqual(parts, timings["total"], delta=0.5)
+
+    def test_fast_callback_is_not_dumped(self):
+        self.post(0)
+        self.profiler.flush()
+        self.assertListEqual(os.listdir(self.directory), [])
+        self.assertEqual(
+            self.profiler.stats()["callbacks"]["slow_callback"]["calls"], 1
+        )
+
+    @data("speedscope", "collapsed")
+    def test_slow_callback_is_dumped_with_its_inputs(self, fmt):
+        self.profiler.fmt = fmt
+        self.post(0.1)
+        self.profiler.flush()
+        names = sorted(os.listdir(self.directory))
+        self.assertEqual(len(names), 2)
+        meta_name = next(name for name in names if name.endswith("ms.json"))
+        with open(os.path.join(self.directory, meta_name)) as f:
+            meta = json.load(f)
+        self.assertEqual(meta["callback"], "slow_callback")
+        self.assertListEqual(meta["inputs"], ["0.1"])
+        with open(os.path.join(self.directory, meta["profile"])) as f:
+            profile = f.read()
+        self.assertIn("fetch (test_profiling.py", profile)
+
+    def test_profiles_are_written_after_the_response(self):
+        written = threading.Event()
+        dump = self.profiler._dump
+
+        def slow_dump(*args):
+            time.sleep(0.2)
+            dump(*args)
+            written.set()
+
+        self.profiler._dump = slow_dump
+        timings = self.server_timing(self.post(0.06))
+        self.assertFalse(written.is_set())
+        self.assertLess(timings["serialize"], 100)
+        self.profiler.flush()
+        self.assertTrue(written.is_set())
+
+    def test_old_profiles_are_pruned(self):
+        self.profiler.max_dumps = 1
+        self.post(0.06)
+        self.post(0.07)
+        self.profiler.flush()
+        names = os.listdir(self.directory)
+        self.assertEqual(len([n for n in names if n.endswith("ms.json")]), 1)
+        stats = self.profiler.stats()["callbacks"]["slow_callback"]
+        self.assertEqual(stats["dumps"], 2)
+
+    def test_disabled_profiler_adds_nothing(self):
+        self.profiler.enabled = False
+        response = self.post(0.1)
+        self.profiler.flush()
+        self.assertNotIn("Server-Timing", response.headers)
+        self.assertListEqual(os.listdir(self.directory), [])
+
+    def test_admin_route_switches_the_profiler(self):
+        response = self.client.post("/_profiling", json={"enabled": False})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            "/_profiling",
+            json={"enabled": False, "threshold": 2},
+            headers={"X-Profiling-Token": "secret"},
+        )
+        self.assertFalse(response.get_json()["enabled"])
+        self.assertEqual(self.profiler.threshold, 2)
+
+    def test_memory_mode_reports_the_peak_allocation(self):
+        self.profiler.memory = True
+        response = self.post(0)
+        self.assertIn('memory;desc="peak', response.headers["Server-Timing"])
+        stats = self.profiler.stats()["callbacks"]["slow_callback"]
+        self.assertEqual(stats["memory_calls"], 1)
+        self.assertGreater(stats["peak_bytes_max"], 0)
+
+    def test_memory_is_traced_only_while_the_profiler_is_enabled(self):
+        self.profiler.enabled = False
+        self.profiler.memory = True
+        self.assertFalse(tracemalloc.is_tracing())
+        self.profiler.enabled = True
+        self.assertTrue(tracemalloc.is_tracing())
+        self.profiler.enabled = False
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_collapsed_stacks_are_counted(self):
+        samples = [(0, ("a", "b")), (1, ("a", "b")), (2, ("a", "c"))]
+        self.assertEqual(collapsed(samples), "a;b 2\na;c 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
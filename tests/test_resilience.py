@@ -0,0 +1,279 @@
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import requests
+from .context import (
+    CircuitBreaker,
+    CircuitOpen,
+    DeadlineExceeded,
+    FakeClock,
+    LastGood,
+    SingleFlight,
+    UpstreamUnavailable,
+    deadline,
+    fetch,
+    get_results,
+    is_stale,
+    map_within_deadline,
+    remaining,
+    stale_scope,
+)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, reset_timeout=10, clock=self.clock
+        )
+
+    def trip(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.trip()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+    def test_success_resets_the_failure_count(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_a_single_trial_request(self):
+        self.trip()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+    def test_failed_trial_opens_the_breaker_again(self):
+        self.trip()
+        self.clock.now = 10
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_released_trial_allows_another_one(self):
+        self.trip()
+        self.clock.now = 10
+        self.breaker.before_call()
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+
+    def test_successful_trial_closes_the_breaker(self):
+        self.trip()
+        self.clock.now = 10
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestLastGood(unittest.TestCase):
+    def test_recall_marks_the_callback_as_stale(self):
+        last_good = LastGood(max_bytes=2)
+        with deadline(1):
+            last_good.remember("a", [1], 1)
+            self.assertFalse(is_stale())
+            self.assertEqual(last_good.recall("a", default=[]), [1])
+            self.assertTrue(is_stale())
+
+    def test_recall_of_unknown_key_returns_the_default_as_stale(self):
+        last_good = LastGood(max_bytes=2)
+        with deadline(1):
+            self.assertEqual(last_good.recall("a", default=[]), [])
+            self.assertTrue(is_stale())
+
+    def test_least_recently_used_value_is_evicted(self):
+        last_good = LastGood(max_bytes=2)
+        last_good.remember("a", 1, 1)
+        last_good.remember("b", 2, 1)
+        last_good.recall("a", default=None)
+        last_good.remember("c", 3, 1)
+        self.assertIsNone(last_good.recall("b", default=None))
+        self.assertEqual(last_good.recall("a", default=None), 1)
+
+    def test_values_are_evicted_to_stay_within_max_bytes(self):
+        last_good = LastGood(max_bytes=10)
+        last_good.remember("a", "x" * 4, 4)
+        last_good.remember("b", "x" * 4, 4)
+        last_good.remember("a", "x" * 6, 6)
+        self.assertEqual(last_good.nbytes, 10)
+        last_good.remember("c", "x" * 3, 3)
+        self.assertEqual(last_good.nbytes, 9)
+        self.assertIsNone(last_good.recall("b", default=None))
+
+    def test_value_larger_than_max_bytes_is_not_kept(self):
+        last_good = LastGood(max_bytes=10)
+        last_good.remember("a", "x", 1)
+        last_good.remember("a", "x" * 11, 11)
+        self.assertIsNone(last_good.recall("a", default=None))
+        self.assertEqual(last_good.nbytes, 0)
+
+
+def response(status_code, results=()):
+    text = json.dumps({"results": list(results)})
+    return SimpleNamespace(status_code=status_code, ok=status_code < 400, text=text)
+
+
+class TestFetch(unittest.TestCase):
+    URL = "https://api.fda.gov/device/event.json?count=event_type"
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        self.last_good = LastGood(max_bytes=4096)
+        patches = [
+            mock.patch("dash_fda.resilience.resilience.breaker", self.breaker),
+            mock.patch("dash_fda.utils.utils.last_good", self.last_good),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def get(self, **kwargs):
+        """Patch the HTTP client used by fetch."""
+        return mock.patch(
+            "dash_fda.resilience.resilience.requests.get", autospec=True, **kwargs
+        )
+
+    def test_timeout_raises_deadline_exceeded(self):
+        with self.get(side_effect=requests.Timeout("slow")):
+            for _ in range(2):
+                with self.assertRaises(DeadlineExceeded):
+                    fetch(self.URL)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_timeout_cut_short_by_the_deadline_is_not_a_failure(self):
+        with self.get(side_effect=requests.Timeout("slow")) as get, deadline(1):
+            for _ in range(2):
+                with self.assertRaises(DeadlineExceeded):
+                    fetch(self.URL)
+        self.assertLessEqual(get.call_args[1]["timeout"], 1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_no_request_once_the_deadline_is_exceeded(self):
+        with self.get() as get, deadline(-1):
+            with self.assertRaises(DeadlineExceeded):
+                fetch(self.URL)
+        get.assert_not_called()
+
+    def test_server_errors_trip_the_breaker(self):
+        with self.get(side_effect=[response(503), response(429)]):
+            for _ in range(2):
+                with self.assertRaises(UpstreamUnavailable):
+                    fetch(self.URL)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            fetch(self.URL)
+
+    def test_client_errors_are_answers(self):
+        with self.get(return_value=response(404)):
+            self.assertEqual(fetch(self.URL).status_code, 404)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failure_serves_the_last_good_results_as_stale(self):
+        results = [{"term": "Injury", "count": 1}]
+        with self.get(return_value=response(200, results)), deadline(1):
+            self.assertListEqual(get_results(self.URL), results)
+            self.assertFalse(is_stale())
+        with self.get(side_effect=requests.ConnectionError()), deadline(1):
+            self.assertListEqual(get_results(self.URL), results)
+            self.assertTrue(is_stale())
+
+    def test_failure_without_last_good_results_is_stale(self):
+        with self.get(side_effect=requests.ConnectionError()), deadline(1):
+            self.assertListEqual(get_results(self.URL), [])
+            self.assertTrue(is_stale())
+
+
+class TestStaleScope(unittest.TestCase):
+    def test_fresh_result_after_a_stale_one_is_not_stale(self):
+        last_good = LastGood(max_bytes=2)
+
+        @stale_scope()
+        def load(key):
+            if key == "fresh":
+                return {"stale": is_stale()}
+            return {"value": last_good.recall(key, default=None), "stale": is_stale()}
+
+        with deadline(1):
+            self.assertTrue(load("missing")["stale"])
+            self.assertFalse(load("fresh")["stale"])
+            # the callback as a whole still served a stale result
+            self.assertTrue(is_stale())
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_a_single_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def call(name):
+            calls.append(name)
+            release.wait(timeout=5)
+            return name
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(flight.do("key", lambda: call("leader")))
+        )
+        leader.start()
+        while not calls:
+            time.sleep(0.01)
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(flight.do("key", lambda: call("other")))
+            )
+            for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertListEqual(calls, ["leader"])
+        self.assertListEqual(results, ["leader"] * 4)
+        # once the call is over, the next one runs again
+        self.assertEqual(flight.do("key", lambda: "again"), "again")
+
+    def test_error_of_the_call_is_raised(self):
+        def fail():
+            raise UpstreamUnavailable("openFDA is down")
+
+        flight = SingleFlight()
+        with self.assertRaises(UpstreamUnavailable):
+            flight.do("key", fail)
+        self.assertEqual(flight.do("key", lambda: "again"), "again")
+
+
+class TestMapWithinDeadline(unittest.TestCase):
+    def test_threads_share_the_deadline_of_the_caller(self):
+        with deadline(5):
+            budgets = map_within_deadline(lambda _: remaining(), range(4), 2)
+        self.assertTrue(all(0 < budget <= 5 for budget in budgets))
+
+    def test_stale_result_in_a_thread_marks_the_caller_as_stale(self):
+        last_good = LastGood(max_bytes=2)
+        last_good.remember("a", 1, 1)
+        with deadline(5):
+            results = map_within_deadline(
+                lambda key: last_good.recall(key, default=None), ["a", "b"], 2
+            )
+            self.assertListEqual(results, [1, None])
+            self.assertTrue(is_stale())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+import pandas as pd
+from ddt import ddt, data
+from .context import downsample, zoom_range
+
+
+@ddt
+class TestTimeline(unittest.TestCase):
+    def setUp(self):
+        self.series = pd.Series(
+            np.arange(10000, dtype=float),
+            index=pd.date_range("1991-01-01", periods=10000, freq="D"),
+        )
+
+    @data(
+        {"xaxis.range[0]": "2000-01-01", "xaxis.range[1]": "2001-01-01 12:00"},
+        {"xaxis.range": ["2000-01-01", "2001-01-01 12:00"]},
+    )
+    def test_zoom_range(self, relayout_data):
+        self.assertTupleEqual(
+            zoom_range(relayout_data),
+            (pd.Timestamp("2000-01-01"), pd.Timestamp("2001-01-01 12:00")),
+        )
+
+    @data(None, {"autosize": True}, {"yaxis.range[0]": 0, "yaxis.range[1]": 10})
+    def test_no_change_of_the_x_axis(self, relayout_data):
+        self.assertIsNone(zoom_range(relayout_data))
+
+    def test_autorange_resets_the_zoom(self):
+        self.assertTupleEqual(zoom_range({"xaxis.autorange": True}), (None, None))
+
+    def test_whole_history_is_downsampled(self):
+        daily = downsample(self.series, 500)
+        self.assertEqual(len(daily), 500)
+        self.assertEqual(daily.index[0], self.series.index[0])
+        self.assertEqual(daily.index[-1], self.series.index[-1])
+
+    def test_small_window_is_at_full_resolution(self):
+        start, end = pd.Timestamp("2000-01-01"), pd.Timestamp("2000-03-01")
+        daily = downsample(self.series, 500, (start, end))
+        self.assertTrue(daily.equals(self.series.loc["1999-12-02":"2000-03-31"]))
+
+
+if __name__ == "__main__":
+    unittest.main()